@@ -1,15 +1,153 @@
 import base64
+import binascii
+from io import BytesIO
 
-from django.core.files.base import ContentFile
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import (
+    InMemoryUploadedFile,
+    TemporaryUploadedFile,
+)
+from PIL import Image
 from rest_framework import serializers
+from rest_framework.relations import MANY_RELATION_KWARGS
+
+BASE64_CHUNK_SIZE = 64 * 1024
 
 
 class Base64ImageField(serializers.ImageField):
+    """Картинка в виде data URI.
+
+    Строка base64 декодируется кусками прямо в файл: небольшие картинки
+    остаются в памяти, большие пишутся во временный файл на диске, как
+    это делают обработчики загрузки Django. Размер проверяется до
+    декодирования, а число пикселей — по заголовку, без распаковки.
+    """
+
+    default_error_messages = {
+        'file_too_large': (
+            'Размер изображения не должен превышать {max_size} байт.'
+        ),
+        'too_many_pixels': (
+            'Изображение не должно быть больше {max_pixels} пикселей.'
+        ),
+    }
+
+    def decoded_size(self, data, start):
+        padding = data[-2:].count('=')
+        return (len(data) - start) * 3 // 4 - padding
+
+    def decode(self, data, start, file):
+        tail = ''
+        for position in range(start, len(data), BASE64_CHUNK_SIZE):
+            chunk = tail + ''.join(
+                data[position : position + BASE64_CHUNK_SIZE].split()
+            )
+            usable = len(chunk) - len(chunk) % 4
+            file.write(base64.b64decode(chunk[:usable]))
+            tail = chunk[usable:]
+        if tail:
+            file.write(base64.b64decode(tail))
+
+    def check_pixels(self, file):
+        try:
+            with Image.open(file) as image:
+                width, height = image.size
+        except Image.DecompressionBombError:
+            width = height = settings.MAX_IMAGE_PIXELS
+        except Exception:
+            self.fail('invalid_image')
+        if width * height > settings.MAX_IMAGE_PIXELS:
+            self.fail('too_many_pixels', max_pixels=settings.MAX_IMAGE_PIXELS)
+        file.seek(0)
+
     def to_internal_value(self, data):
         if isinstance(data, str) and data.startswith('data:image'):
-            format_, img_str = data.split(';base64,')
-            ext = format_.split('/')[-1]
+            marker = data.find(';base64,')
+            if marker == -1:
+                self.fail('invalid_image')
+            ext = data[:marker].split('/')[-1]
+            start = marker + len(';base64,')
 
-            data = ContentFile(base64.b64decode(img_str), name='temp.' + ext)
+            size = self.decoded_size(data, start)
+            if size > settings.MAX_IMAGE_UPLOAD_SIZE:
+                self.fail(
+                    'file_too_large', max_size=settings.MAX_IMAGE_UPLOAD_SIZE
+                )
+
+            name = 'temp.' + ext
+            content_type = f'image/{ext}'
+            if size > settings.FILE_UPLOAD_MAX_MEMORY_SIZE:
+                file = TemporaryUploadedFile(name, content_type, size, None)
+            else:
+                file = InMemoryUploadedFile(
+                    BytesIO(), None, name, content_type, size, None
+                )
+            try:
+                self.decode(data, start, file.file)
+            except (binascii.Error, ValueError):
+                self.fail('invalid_image')
+            file.size = file.file.tell()
+            file.seek(0)
+            self.check_pixels(file)
+            data = file
 
         return super().to_internal_value(data)
+
+
+class ImageRenditionsField(serializers.Field):
+    """Уменьшенные копии картинки в формате атрибута srcset:
+    {"webp": "url 300w, url 600w", "jpeg": "..."}."""
+
+    def __init__(self, **kwargs):
+        kwargs.setdefault('source', 'renditions')
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, renditions):
+        request = self.context.get('request')
+        srcset = {}
+        for extension, items in renditions.items():
+            urls = []
+            for width, name in items:
+                url = default_storage.url(name)
+                if request is not None:
+                    url = request.build_absolute_uri(url)
+                urls.append(f'{url} {width}w')
+            srcset[extension] = ', '.join(urls)
+        return srcset
+
+
+class BulkManyRelatedField(serializers.ManyRelatedField):
+    """Список первичных ключей, проверяемый одним запросом id__in,
+    а не отдельным запросом на каждый ключ."""
+
+    def to_internal_value(self, data):
+        if isinstance(data, str) or not hasattr(data, '__iter__'):
+            self.fail('not_a_list', input_type=type(data).__name__)
+        if not self.allow_empty and len(data) == 0:
+            self.fail('empty')
+        child = self.child_relation
+        queryset = child.get_queryset()
+        pks = []
+        for pk in data:
+            try:
+                pks.append(queryset.model._meta.pk.to_python(pk))
+            except (TypeError, ValidationError):
+                child.fail('incorrect_type', data_type=type(pk).__name__)
+        objects = queryset.in_bulk(pks)
+        for pk in pks:
+            if pk not in objects:
+                child.fail('does_not_exist', pk_value=pk)
+        return [objects[pk] for pk in pks]
+
+
+class BulkPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    @classmethod
+    def many_init(cls, *args, **kwargs):
+        list_kwargs = {'child_relation': cls(*args, **kwargs)}
+        for key in kwargs:
+            if key in MANY_RELATION_KWARGS:
+                list_kwargs[key] = kwargs[key]
+        return BulkManyRelatedField(**list_kwargs)
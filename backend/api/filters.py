@@ -1,6 +1,13 @@
+from django.db.models import Exists, F, OuterRef
 from django_filters import rest_framework as filters, BaseInFilter
 
-from recipes.models import Recipe
+from recipes.models import (
+    Recipe,
+    RecipeTag,
+    Tag,
+    TAGS_MASK_SIZE,
+    get_tags_mask,
+)
 
 
 class InFilter(BaseInFilter, filters.CharFilter):
@@ -19,4 +26,21 @@ class RecipeFilter(filters.FilterSet):
 
     def filter_tags(self, queryset, name, value):
         tags = self.request.query_params.getlist('tags')
-        return queryset.filter(tags__slug__in=tags).distinct()
+        tag_ids = list(
+            Tag.objects.filter(slug__in=tags).values_list('id', flat=True)
+        )
+        if not tag_ids:
+            return queryset.none()
+        if max(tag_ids) <= TAGS_MASK_SIZE:
+            # любой из тегов — одна проверка маски, без JOIN
+            return queryset.alias(
+                matched_tags=F('tags_mask').bitand(get_tags_mask(tag_ids))
+            ).filter(matched_tags__gt=0)
+        # EXISTS не размножает строки рецептов и не требует DISTINCT
+        return queryset.filter(
+            Exists(
+                RecipeTag.objects.filter(
+                    recipe=OuterRef('pk'), tag_id__in=tag_ids
+                )
+            )
+        )
@@ -0,0 +1,74 @@
+import gzip
+from hashlib import md5
+
+from django.core.cache import cache
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.cache import patch_vary_headers
+from rest_framework import status
+from rest_framework.renderers import JSONRenderer
+
+from core.models import TableVersion
+
+JSON = 'application/json'
+
+
+class VersionedCacheMixin:
+    """Кэширует готовые JSON-ответы read-only вьюсета.
+
+    Ключ кэша и ETag строятся из версий таблиц versioned_models
+    (см. TableVersion) и пути запроса, поэтому ответ на If-None-Match
+    не требует ни выборки, ни сериализации.
+    """
+
+    versioned_models = ()
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(
+            super().retrieve, request, *args, **kwargs
+        )
+
+    def get_cache_key(self, request):
+        versions = ':'.join(
+            '{0}={1}'.format(
+                model._meta.db_table, TableVersion.get(model._meta.db_table)
+            )
+            for model in self.versioned_models
+        )
+        return md5(
+            '{0}|{1}'.format(versions, request.get_full_path()).encode()
+        ).hexdigest()
+
+    def cached_response(self, handler, request, *args, **kwargs):
+        if request.accepted_renderer.format != 'json':
+            return handler(request, *args, **kwargs)
+
+        key = self.get_cache_key(request)
+        etag = 'W/"{0}"'.format(key)
+        if etag in request.META.get('HTTP_IF_NONE_MATCH', ''):
+            response = HttpResponseNotModified()
+            response['ETag'] = etag
+            return response
+
+        cache_key = 'api-response:{0}'.format(key)
+        entry = cache.get(cache_key)
+        if entry is None:
+            response = handler(request, *args, **kwargs)
+            if response.status_code != status.HTTP_200_OK:
+                return response
+            body = JSONRenderer().render(response.data)
+            entry = (body, gzip.compress(body))
+            cache.set(cache_key, entry)
+
+        body, compressed = entry
+        if 'gzip' in request.META.get('HTTP_ACCEPT_ENCODING', ''):
+            response = HttpResponse(compressed, content_type=JSON)
+            response['Content-Encoding'] = 'gzip'
+        else:
+            response = HttpResponse(body, content_type=JSON)
+        response['ETag'] = etag
+        response['Cache-Control'] = 'no-cache'
+        patch_vary_headers(response, ('Accept-Encoding',))
+        return response
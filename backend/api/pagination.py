@@ -1,13 +1,241 @@
-from rest_framework.pagination import PageNumberPagination
+import hashlib
+from collections import OrderedDict
 
+from django.conf import settings
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from django.utils.functional import cached_property
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+from rest_framework.response import Response
+
+
+class CachedCountPaginator(Paginator):
+    """Paginator, который кеширует количество объектов, а для больших
+    таблиц без фильтров берёт оценку reltuples из pg_class."""
+
+    def __init__(self, object_list, per_page, cache_key=None, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self.cache_key = cache_key
+        self.count_is_approximate = False
+
+    def estimate_count(self):
+        queryset = self.object_list
+        connection = connections[queryset.db]
+        if (
+            connection.vendor != 'postgresql'
+            or queryset.query.where
+            or queryset.query.distinct
+        ):
+            return None
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT reltuples::bigint FROM pg_class '
+                'WHERE oid = %s::regclass',
+                [queryset.model._meta.db_table],
+            )
+            row = cursor.fetchone()
+        if row is None or row[0] < settings.APPROXIMATE_COUNT_THRESHOLD:
+            return None
+        return row[0]
+
+    def count_objects(self):
+        estimate = self.estimate_count()
+        if estimate is not None:
+            return estimate, True
+        return self.object_list.count(), False
+
+    @cached_property
+    def count(self):
+        if self.cache_key is None:
+            count, approximate = self.count_objects()
+        else:
+            cached = cache.get(self.cache_key)
+            if cached is None:
+                cached = self.count_objects()
+                cache.set(
+                    self.cache_key, cached, settings.PAGINATION_COUNT_CACHE_TTL
+                )
+            count, approximate = cached
+        self.count_is_approximate = approximate
+        return count
+
+
+class CachedCountPagination(PageNumberPagination):
+    """Постраничная пагинация с кешированным количеством объектов.
+
+    Ключ кеша строится из пути и параметров фильтрации без номера
+    и размера страницы; id пользователя добавляется, если от него
+    зависит выборка. В ответе поле count_is_approximate показывает,
+    что count — оценка, а не точное число.
+    """
+
+    count_per_user = False
+    user_filter_params = ()
+
+    # DRF создаёт paginator вызовом django_paginator_class(queryset, size)
+    def django_paginator_class(self, queryset, page_size):
+        return CachedCountPaginator(
+            queryset, page_size, cache_key=self.get_count_cache_key()
+        )
+
+    def count_depends_on_user(self, request):
+        return self.count_per_user or any(
+            param in request.query_params for param in self.user_filter_params
+        )
+
+    def get_count_cache_key(self):
+        request = self.request
+        ignored = (self.page_query_param, self.page_size_query_param)
+        params = sorted(
+            (key, sorted(values))
+            for key, values in request.query_params.lists()
+            if key not in ignored
+        )
+        parts = [request.path, repr(params)]
+        if self.count_depends_on_user(request):
+            parts.append(str(request.user.pk))
+        digest = hashlib.md5('|'.join(parts).encode()).hexdigest()
+        return f'pagination-count:{digest}'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        # ключ кеша строится по запросу, а DRF сохраняет его
+        # в self.request уже после создания paginator
+        self.request = request
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        paginator = self.page.paginator
+        return Response(
+            OrderedDict(
+                [
+                    ('count', paginator.count),
+                    ('count_is_approximate', paginator.count_is_approximate),
+                    ('next', self.get_next_link()),
+                    ('previous', self.get_previous_link()),
+                    ('results', data),
+                ]
+            )
+        )
+
+
+class RecipesCursorPagination(CursorPagination):
+    """Пагинация по курсору (created, id) без OFFSET и COUNT(*):
+    любая страница ленты читается по индексу одинаково быстро.
+
+    CursorPagination из DRF сравнивает только первое поле ordering,
+    а рецепты с тем же created пропускает через OFFSET. Здесь позиция
+    курсора — пара (created, id), страница выбирается условием
+    created < X OR (created = X AND id < Y), и OFFSET всегда равен 0.
+    """
 
-class RecipesPagination(PageNumberPagination):
     page_size = 6
     page_size_query_param = 'limit'
     max_page_size = 10
+    ordering = ('-created', '-id')
+
+    def decode_cursor(self, request):
+        # пустой ?cursor= включает режим курсора с первой страницы
+        if not request.query_params.get(self.cursor_query_param):
+            return None
+        return super().decode_cursor(request)
+
+    def _get_position_from_instance(self, instance, ordering):
+        return f'{instance.created.isoformat()},{instance.pk}'
+
+    def get_position_filter(self, position, reverse):
+        """Условие для рецептов после позиции (перед ней, если reverse)."""
+        created, _, pk = position.rpartition(',')
+        created = parse_datetime(created)
+        if created is None or not pk.isdigit():
+            raise NotFound(self.invalid_cursor_message)
+        lookup, bound = ('gt', 'gte') if reverse else ('lt', 'lte')
+        # условие по одному created позволяет взять диапазон индекса
+        return Q(**{f'created__{bound}': created}) & (
+            Q(**{f'created__{lookup}': created})
+            | Q(created=created, **{f'id__{lookup}': int(pk)})
+        )
+
+    def paginate_queryset(self, queryset, request, view=None):
+        # повторяет CursorPagination.paginate_queryset, но фильтрует
+        # по паре (created, id)
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.cursor = self.decode_cursor(request)
+        if self.cursor is None:
+            offset, reverse, current_position = (0, False, None)
+        else:
+            offset, reverse, current_position = self.cursor
+
+        if reverse:
+            queryset = queryset.order_by('created', 'id')
+        else:
+            queryset = queryset.order_by(*self.ordering)
+        if current_position is not None:
+            queryset = queryset.filter(
+                self.get_position_filter(current_position, reverse)
+            )
+
+        results = list(queryset[offset : offset + self.page_size + 1])
+        self.page = results[: self.page_size]
+        if len(results) > len(self.page):
+            following_position = self._get_position_from_instance(
+                results[-1], self.ordering
+            )
+        else:
+            following_position = None
+
+        if reverse:
+            self.page.reverse()
+            self.has_next = current_position is not None or offset > 0
+            self.has_previous = following_position is not None
+            self.next_position = current_position
+            self.previous_position = following_position
+        else:
+            self.has_next = following_position is not None
+            self.has_previous = current_position is not None or offset > 0
+            self.next_position = following_position
+            self.previous_position = current_position
+
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+        return self.page
+
+
+class RecipesPagination(CachedCountPagination):
+    """Постраничная пагинация; с параметром cursor — по курсору."""
+
+    page_size = 6
+    page_size_query_param = 'limit'
+    max_page_size = 10
+    user_filter_params = ('is_favorited', 'is_in_shopping_cart')
+    cursor_pagination_class = RecipesCursorPagination
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.cursor_paginator = None
+        cursor_param = self.cursor_pagination_class.cursor_query_param
+        if cursor_param in request.query_params:
+            self.cursor_paginator = self.cursor_pagination_class()
+            return self.cursor_paginator.paginate_queryset(
+                queryset, request, view
+            )
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.cursor_paginator is not None:
+            return self.cursor_paginator.get_paginated_response(data)
+        return super().get_paginated_response(data)
 
 
-class UsersPagination(PageNumberPagination):
+class UsersPagination(CachedCountPagination):
     page_size = 10
     page_size_query_param = 'limit'
     max_page_size = 100
+    # список пользователей и подписки зависят от того, кто спрашивает
+    count_per_user = True
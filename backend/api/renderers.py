@@ -0,0 +1,74 @@
+import csv
+import json
+
+from rest_framework.renderers import BaseRenderer
+
+
+class ShoppingListRenderer(BaseRenderer):
+    """Формат выгрузки списка покупок.
+
+    Текстовые форматы отдают список потоком через stream(строки),
+    где строка — (название, единица измерения, количество). PDF
+    собирается целиком во view. render() используется DRF только
+    для ответов с ошибками.
+    """
+
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        response = (renderer_context or {}).get('response')
+        if response is not None:
+            response['Content-Type'] = 'application/json'
+        return json.dumps(data, ensure_ascii=False).encode(self.charset)
+
+
+class PDFRenderer(ShoppingListRenderer):
+    media_type = 'application/pdf'
+    format = 'pdf'
+
+
+class PlainTextRenderer(ShoppingListRenderer):
+    media_type = 'text/plain'
+    format = 'txt'
+
+    def stream(self, rows):
+        yield 'Список покупок\n\n'
+        for count, (name, unit, amount) in enumerate(rows, 1):
+            yield f'{count}. {name.capitalize()} - {amount} {unit}\n'
+
+
+class Echo:
+    """Файлоподобный объект для csv.writer, возвращающий строку."""
+
+    def write(self, value):
+        return value
+
+
+class CSVRenderer(ShoppingListRenderer):
+    media_type = 'text/csv'
+    format = 'csv'
+
+    def stream(self, rows):
+        writer = csv.writer(Echo())
+        yield writer.writerow(('name', 'measurement_unit', 'amount'))
+        for row in rows:
+            yield writer.writerow(row)
+
+
+class JSONShoppingListRenderer(ShoppingListRenderer):
+    media_type = 'application/json'
+    format = 'json'
+
+    def stream(self, rows):
+        separator = '['
+        for name, measurement_unit, amount in rows:
+            yield separator + json.dumps(
+                {
+                    'name': name,
+                    'measurement_unit': measurement_unit,
+                    'amount': amount,
+                },
+                ensure_ascii=False,
+            )
+            separator = ','
+        yield '[]' if separator == '[' else ']'
@@ -0,0 +1,112 @@
+import sys
+import threading
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+
+from django.conf import settings
+
+from core.models import TableVersion
+from recipes.models import Ingredient
+
+
+def normalize(name):
+    return name.casefold().replace('ё', 'е')
+
+
+class Keys:
+    """Последовательность ключей поверх склеенной строки для bisect:
+    ключ вырезается из строки по смещениям только при сравнении."""
+
+    def __init__(self, haystack, offsets):
+        self.haystack = haystack
+        self.offsets = offsets
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, index):
+        return self.haystack[self.offsets[index] : self.offsets[index + 1] - 1]
+
+
+class IngredientIndex:
+    """Индекс названий ингредиентов в памяти воркера.
+
+    Названия хранятся отсортированными по нормализованному ключу.
+    Ключи лежат только в одной склеенной строке: совпадения с начала
+    ищутся по ней бинарным поиском, вхождения в середине — поиском
+    подстроки. Индекс перестраивается, когда меняется версия таблицы
+    ингредиентов в TableVersion. Включается INGREDIENT_SEARCH_IN_MEMORY,
+    по умолчанию поиск идёт по триграммному индексу в базе.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._checked_at = 0.0
+        self._data = None
+
+    def _build(self):
+        rows = sorted(
+            (normalize(name), pk, name, sys.intern(unit))
+            for pk, name, unit in Ingredient.objects.values_list(
+                'id', 'name', 'measurement_unit'
+            ).iterator()
+        )
+        # offsets[i] — начало i-го ключа, последний элемент — конец строки
+        offsets = array('q', [0])
+        for row in rows:
+            offsets.append(offsets[-1] + len(row[0]) + 1)
+        haystack = '\n'.join(row[0] for row in rows)
+        return (
+            Keys(haystack, offsets),
+            haystack,
+            offsets,
+            array('q', (row[1] for row in rows)),
+            [row[2] for row in rows],
+            [row[3] for row in rows],
+        )
+
+    def _refresh(self):
+        now = time.monotonic()
+        interval = settings.INGREDIENT_INDEX_CHECK_INTERVAL
+        if self._data is not None and now - self._checked_at < interval:
+            return self._data
+        with self._lock:
+            # версия читается до строк: иначе можно пометить старые
+            # данные новой версией и больше их не перестроить
+            version = TableVersion.get(Ingredient._meta.db_table)
+            if self._data is None or version != self._version:
+                self._data = self._build()
+                self._version = version
+            self._checked_at = now
+            return self._data
+
+    def search(self, query, limit=None):
+        keys, haystack, offsets, ids, names, units = self._refresh()
+        needle = normalize(query.strip()).replace('\n', ' ')
+        start = bisect_left(keys, needle)
+        end = bisect_left(keys, needle + chr(sys.maxunicode), start)
+        found = list(range(start, end))[:limit]
+
+        position = haystack.find(needle)
+        while position != -1 and (limit is None or len(found) < limit):
+            index = bisect_right(offsets, position) - 1
+            if not start <= index < end:
+                found.append(index)
+            next_key = index + 1
+            if next_key == len(keys):
+                break
+            position = haystack.find(needle, offsets[next_key])
+
+        return [
+            {
+                'id': ids[index],
+                'name': names[index],
+                'measurement_unit': units[index],
+            }
+            for index in found
+        ]
+
+
+ingredient_index = IngredientIndex()
@@ -1,8 +1,23 @@
+from django.db import transaction
+from django.db.models import Prefetch, prefetch_related_objects
 from djoser.serializers import UserCreateSerializer
 from rest_framework import serializers
 
-from api.fields import Base64ImageField
-from recipes.models import Tag, Ingredient, RecipeIngredient, Recipe
+from api.fields import (
+    Base64ImageField,
+    BulkPrimaryKeyRelatedField,
+    ImageRenditionsField,
+)
+from api.utilities import update_recipe_in_shopping_lists
+from recipes.models import (
+    Tag,
+    Ingredient,
+    RecipeIngredient,
+    Recipe,
+    RecipeTag,
+    ShoppingListJob,
+    get_tags_mask,
+)
 from users.models import User
 
 
@@ -49,13 +64,12 @@ class RecipeIngredientSerializer(serializers.ModelSerializer):
 
 class RecipeSerializer(serializers.ModelSerializer):
     author = serializers.SerializerMethodField(read_only=True)
-    tags = serializers.PrimaryKeyRelatedField(
-        queryset=Tag.objects.all(), many=True
-    )
+    tags = BulkPrimaryKeyRelatedField(queryset=Tag.objects.all(), many=True)
     ingredients = RecipeIngredientSerializer(
         source='recipe_ingredients', required=True, many=True
     )
     image = Base64ImageField(required=True)
+    image_renditions = ImageRenditionsField()
     is_favorited = serializers.SerializerMethodField(read_only=True)
     is_in_shopping_cart = serializers.SerializerMethodField(read_only=True)
 
@@ -68,6 +82,7 @@ class RecipeSerializer(serializers.ModelSerializer):
             'ingredients',
             'name',
             'image',
+            'image_renditions',
             'text',
             'cooking_time',
             'is_favorited',
@@ -81,6 +96,16 @@ class RecipeSerializer(serializers.ModelSerializer):
         }
 
     def to_representation(self, instance):
+        # после create и update кеш prefetch пуст, и без этого
+        # каждый ингредиент читался бы отдельным запросом
+        prefetch_related_objects(
+            [instance],
+            'tags',
+            Prefetch(
+                'recipe_ingredients',
+                queryset=RecipeIngredient.objects.select_related('ingredient'),
+            ),
+        )
         representation = super().to_representation(instance)
         representation['tags'] = TagSerializer(
             instance.tags.all(), many=True
@@ -95,6 +120,9 @@ class RecipeSerializer(serializers.ModelSerializer):
         return cooking_time
 
     def get_author(self, recipe):
+        # флаг подписки уже посчитан в запросе рецептов
+        if hasattr(recipe, 'is_author_subscribed'):
+            recipe.author.is_subscribed = recipe.is_author_subscribed
         author_data = CustomUserSerializer(
             recipe.author, context=self.context
         ).data
@@ -110,8 +138,33 @@ class RecipeSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError(
                 'В рецепте не должно быть одинаковых ингредиентов'
             )
+        existing = set(
+            Ingredient.objects.filter(id__in=ingredients_ids).values_list(
+                'id', flat=True
+            )
+        )
+        missing = [pk for pk in ingredients_ids if pk not in existing]
+        if missing:
+            raise serializers.ValidationError(
+                'Ингредиенты не найдены: {0}'.format(
+                    ', '.join(map(str, missing))
+                )
+            )
         return recipe_ingredient_set
 
+    def defer_image_save(self, validated_data):
+        """Подставляет вместо картинки имя файла, а сам файл пишет
+        только после коммита: при ошибке в базе он не останется
+        на диске. Имя определяется содержимым, поэтому известно
+        заранее (см. ContentHashStorage)."""
+        image = validated_data['image']
+        field = Recipe._meta.get_field('image')
+        name = field.storage.hashed_name(
+            field.generate_filename(None, image.name), image
+        )
+        validated_data['image'] = name
+        transaction.on_commit(lambda: field.storage.save(name, image))
+
     def create_recipe_ingredients(self, recipe, recipe_ingredients):
         recipe_ingredients_data = []
 
@@ -126,40 +179,109 @@ class RecipeSerializer(serializers.ModelSerializer):
 
         RecipeIngredient.objects.bulk_create(recipe_ingredients_data)
 
+    def update_recipe_tags(self, recipe, tags):
+        """Удаляет лишние и добавляет новые связи с тегами."""
+        tag_ids = {tag.id for tag in tags}
+        current = dict(
+            RecipeTag.objects.filter(recipe=recipe).values_list('tag_id', 'id')
+        )
+        stale = [pk for tag_id, pk in current.items() if tag_id not in tag_ids]
+        if stale:
+            RecipeTag.objects.filter(id__in=stale).delete()
+        RecipeTag.objects.bulk_create(
+            [
+                RecipeTag(recipe=recipe, tag_id=tag_id)
+                for tag_id in tag_ids - current.keys()
+            ]
+        )
+
+    def update_recipe_ingredients(self, recipe, current, amounts):
+        """Приводит ингредиенты рецепта к amounts {ingredient_id: amount}:
+        не больше одного DELETE, INSERT и UPDATE, строки без изменений
+        (и их id) остаются как есть."""
+        stale = [
+            item.id for item in current if item.ingredient_id not in amounts
+        ]
+        if stale:
+            RecipeIngredient.objects.filter(id__in=stale).delete()
+        changed = []
+        for item in current:
+            amount = amounts.get(item.ingredient_id)
+            if amount is not None and amount != item.amount:
+                item.amount = amount
+                changed.append(item)
+        if changed:
+            RecipeIngredient.objects.bulk_update(changed, ['amount'])
+        existing = {item.ingredient_id for item in current}
+        RecipeIngredient.objects.bulk_create(
+            [
+                RecipeIngredient(
+                    recipe=recipe, ingredient_id=ingredient_id, amount=amount
+                )
+                for ingredient_id, amount in amounts.items()
+                if ingredient_id not in existing
+            ]
+        )
+
+    @transaction.atomic
     def update(self, recipe, validated_data):
-        recipe_ingredients = validated_data.pop('recipe_ingredients')
+        amounts = {
+            item['ingredient']['id']: item['amount']
+            for item in validated_data.pop('recipe_ingredients')
+        }
         tags = validated_data.pop('tags')
+        # ингредиенты читаются под блокировкой рецепта, которую берёт
+        # и изменение корзины, иначе разница для списков покупок
+        # считалась бы от устаревших количеств
+        list(Recipe.objects.select_for_update().filter(pk=recipe.pk))
+        current = list(
+            RecipeIngredient.objects.filter(recipe=recipe).only(
+                'id', 'ingredient_id', 'amount'
+            )
+        )
+        old_amounts = {
+            item.ingredient_id: item.amount
+            for item in current
+            if item.ingredient_id is not None
+        }
+        validated_data['tags_mask'] = get_tags_mask(tag.id for tag in tags)
+        if 'image' in validated_data:
+            self.defer_image_save(validated_data)
         super().update(recipe, validated_data)
 
-        for tag in recipe.tags.all():
-            recipe.tags.remove(tag)
-        for tag in tags:
-            recipe.tags.add(tag)
-
-        recipe.recipe_ingredients.all().delete()
-        self.create_recipe_ingredients(recipe, recipe_ingredients)
+        self.update_recipe_tags(recipe, tags)
+        self.update_recipe_ingredients(recipe, current, amounts)
+        update_recipe_in_shopping_lists(recipe, old_amounts, amounts)
 
         return recipe
 
+    @transaction.atomic
     def create(self, validated_data):
         recipe_ingredients = validated_data.pop('recipe_ingredients')
-        tags = validated_data.pop('tags')
-        recipe = Recipe.objects.create(**validated_data)
-
-        for tag in tags:
-            recipe.tags.add(tag)
+        tag_ids = {tag.id for tag in validated_data.pop('tags')}
+        self.defer_image_save(validated_data)
+        recipe = Recipe.objects.create(
+            **validated_data, tags_mask=get_tags_mask(tag_ids)
+        )
 
+        RecipeTag.objects.bulk_create(
+            [RecipeTag(recipe=recipe, tag_id=tag_id) for tag_id in tag_ids]
+        )
         self.create_recipe_ingredients(recipe, recipe_ingredients)
 
         return recipe
 
     def get_is_favorited(self, recipe):
+        if hasattr(recipe, 'is_favorited'):
+            return recipe.is_favorited
         user = self.context.get('request').user
         if user.is_authenticated:
             return user.favorites.filter(recipe=recipe).exists()
         return False
 
     def get_is_in_shopping_cart(self, recipe):
+        if hasattr(recipe, 'is_in_shopping_cart'):
+            return recipe.is_in_shopping_cart
         user = self.context.get('request').user
         if user.is_authenticated:
             return user.shopping_cart.filter(recipe=recipe).exists()
@@ -190,6 +312,8 @@ class CustomUserSerializer(serializers.ModelSerializer):
         )
 
     def get_is_subscribed(self, following):
+        if hasattr(following, 'is_subscribed'):
+            return following.is_subscribed
         follower = self.context.get('request').user
         if follower.is_authenticated:
             return follower.following.filter(user=following).exists()
@@ -197,9 +321,11 @@ class CustomUserSerializer(serializers.ModelSerializer):
 
 
 class ReducedRecipeSerializer(serializers.ModelSerializer):
+    image_renditions = ImageRenditionsField()
+
     class Meta:
         model = Recipe
-        fields = ('id', 'name', 'image', 'cooking_time')
+        fields = ('id', 'name', 'image', 'image_renditions', 'cooking_time')
 
 
 class FollowSerializer(CustomUserSerializer):
@@ -220,9 +346,16 @@ class FollowSerializer(CustomUserSerializer):
         )
 
     def get_recipes_count(self, instance):
+        if hasattr(instance, 'recipes_count'):
+            return instance.recipes_count
         return instance.recipes.count()
 
     def get_recipes(self, instance):
+        if hasattr(instance, 'limited_recipes'):
+            serializer = ReducedRecipeSerializer(
+                instance.limited_recipes, many=True
+            )
+            return serializer.data
         request = self.context.get('request')
         recipes_limit = request.query_params.get('recipes_limit')
         if recipes_limit:
@@ -231,3 +364,10 @@ class FollowSerializer(CustomUserSerializer):
             recipes = instance.recipes.all()
         serializer = ReducedRecipeSerializer(recipes, many=True)
         return serializer.data
+
+
+class ShoppingListJobSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ShoppingListJob
+        fields = ('id', 'status', 'error', 'created', 'started', 'finished')
+        read_only_fields = fields
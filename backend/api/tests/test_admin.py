@@ -0,0 +1,86 @@
+from django.contrib.admin import site
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from recipes.models import (
+    Favorite,
+    Ingredient,
+    Recipe,
+    RecipeIngredient,
+    RecipeTag,
+    ShoppingCart,
+    ShoppingListJob,
+    Tag,
+)
+from users.models import Follow, User
+
+
+class AdminChangelistQueriesTest(TestCase):
+    """Число запросов на странице списка в админке не зависит
+    от количества строк в таблице."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser(
+            username='admin', email='admin@example.com', password='password'
+        )
+        cls.tags = [
+            Tag.objects.create(name=slug, color=f'#00000{number}', slug=slug)
+            for number, slug in enumerate(('breakfast', 'lunch'))
+        ]
+        cls.rows = 0
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def add_rows(self, count):
+        """Добавляет count строк в каждую таблицу с разделом в админке."""
+        for _ in range(count):
+            number = self.rows = self.rows + 1
+            user = User.objects.create_user(
+                username=f'user{number}',
+                email=f'user{number}@example.com',
+                password='password',
+            )
+            ingredient = Ingredient.objects.create(
+                name=f'Ингредиент {number}', measurement_unit='г'
+            )
+            recipe = Recipe.objects.create(
+                author=user,
+                name=f'Рецепт {number}',
+                text='Описание',
+                image='recipes/images/image.png',
+                cooking_time=10,
+            )
+            RecipeTag.objects.create(recipe=recipe, tag=self.tags[number % 2])
+            RecipeIngredient.objects.create(
+                recipe=recipe, ingredient=ingredient, amount=number
+            )
+            Favorite.objects.create(user=user, recipe=recipe)
+            # строку ShoppingListItem добавляет сигнал корзины
+            ShoppingCart.objects.create(user=user, recipe=recipe)
+            ShoppingListJob.objects.create(user=user)
+            Follow.objects.create(user=self.admin, following=user)
+
+    def get_changelist(self, model):
+        url = reverse(
+            f'admin:{model._meta.app_label}_{model._meta.model_name}'
+            '_changelist'
+        )
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(context.captured_queries)
+
+    def test_changelist_queries_do_not_grow(self):
+        self.add_rows(2)
+        queries = {
+            model: self.get_changelist(model) for model in site._registry
+        }
+        self.add_rows(20)
+        for model, count in queries.items():
+            with self.subTest(model=model._meta.label):
+                with self.assertNumQueries(count):
+                    self.get_changelist(model)
@@ -0,0 +1,134 @@
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from threading import Barrier
+from unittest import skipUnless
+
+from django.db import connection, connections
+from django.db.models import Sum
+from django.test import TransactionTestCase
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from recipes.models import (
+    Favorite,
+    Ingredient,
+    Recipe,
+    RecipeIngredient,
+    ShoppingCart,
+    ShoppingListItem,
+)
+from users.models import Follow, User, UserCounters
+
+
+@skipUnless(
+    connection.vendor == 'postgresql',
+    'SQLite не допускает параллельной записи',
+)
+class ConcurrentToggleTest(TransactionTestCase):
+    """Одинаковые запросы добавления и удаления, пришедшие
+    одновременно, выполняются ровно один раз и не дают ошибок 500."""
+
+    WORKERS = 8
+    REQUESTS = 16
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='user', email='user@example.com', password='password'
+        )
+        self.author = User.objects.create_user(
+            username='author', email='author@example.com', password='password'
+        )
+        self.token = Token.objects.create(user=self.user).key
+        self.recipe = Recipe.objects.create(
+            author=self.author,
+            name='Рецепт',
+            text='Описание',
+            image='recipes/images/image.png',
+            cooking_time=10,
+        )
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(
+                recipe=self.recipe,
+                ingredient=Ingredient.objects.create(
+                    name=f'Ингредиент {number}', measurement_unit='г'
+                ),
+                amount=number,
+            )
+            for number in range(1, 4)
+        )
+
+    def send(self, barrier, method, url):
+        client = APIClient(raise_request_exception=False)
+        client.credentials(HTTP_AUTHORIZATION=f'Token {self.token}')
+        try:
+            # все потоки отправляют запрос одновременно
+            barrier.wait(timeout=10)
+            return getattr(client, method)(url).status_code
+        finally:
+            connections.close_all()
+
+    def send_concurrently(self, method, url):
+        barrier = Barrier(self.WORKERS)
+        with ThreadPoolExecutor(max_workers=self.WORKERS) as executor:
+            return Counter(
+                executor.map(
+                    lambda _: self.send(barrier, method, url),
+                    range(self.REQUESTS),
+                )
+            )
+
+    def assertToggled(self, url, check):
+        for method, success in (('post', 201), ('delete', 204)):
+            with self.subTest(method=method):
+                statuses = self.send_concurrently(method, url)
+                self.assertEqual(
+                    statuses, {success: 1, 400: self.REQUESTS - 1}
+                )
+                check()
+
+    def check_favorites(self):
+        self.recipe.refresh_from_db()
+        self.assertEqual(
+            self.recipe.favorites_count,
+            Favorite.objects.filter(recipe=self.recipe).count(),
+        )
+
+    def check_shopping_list(self):
+        expected = dict(
+            RecipeIngredient.objects.filter(
+                recipe__shoppingcart__user=self.user
+            )
+            .values('ingredient_id')
+            .annotate(total=Sum('amount'))
+            .values_list('ingredient_id', 'total')
+        )
+        actual = dict(
+            ShoppingListItem.objects.filter(user=self.user).values_list(
+                'ingredient_id', 'amount_sum'
+            )
+        )
+        self.assertEqual(actual, expected)
+
+    def check_followers(self):
+        counters = UserCounters.objects.get(user=self.author)
+        self.assertEqual(
+            counters.followers_count,
+            Follow.objects.filter(user=self.author).count(),
+        )
+
+    def test_favorite(self):
+        self.assertToggled(
+            f'/api/recipes/{self.recipe.id}/favorite/', self.check_favorites
+        )
+
+    def test_shopping_cart(self):
+        self.assertToggled(
+            f'/api/recipes/{self.recipe.id}/shopping_cart/',
+            self.check_shopping_list,
+        )
+        self.assertFalse(ShoppingCart.objects.exists())
+
+    def test_subscribe(self):
+        self.assertToggled(
+            f'/api/users/{self.author.id}/subscribe/', self.check_followers
+        )
@@ -0,0 +1,122 @@
+from unittest import skipUnless
+
+from django.db import connection
+from django.test import TestCase
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from api.views import RecipeViewSet
+from recipes.models import (
+    Favorite,
+    Recipe,
+    RecipeTag,
+    ShoppingCart,
+    Tag,
+    get_tags_mask,
+)
+from users.models import Follow, User
+
+
+@skipUnless(connection.vendor == 'postgresql', 'EXPLAIN для PostgreSQL')
+class RecipeFilterPlanTest(TestCase):
+    """Фильтры списка рецептов не должны приводить к полному
+    просмотру таблиц и к группировке строк.
+
+    Таблицы заполняются так, чтобы у пользователя была малая доля
+    избранного и корзины: на таких данных планировщик выбирает
+    индексы, если фильтр позволяет их использовать. Проверяются
+    только таблицы, которые участвуют в фильтрах.
+    """
+
+    RECIPES = 20000
+    USERS = 100
+    FILTERED_TABLES = (
+        'recipes_recipe',
+        'recipes_recipetag',
+        'recipes_favorite',
+        'recipes_shoppingcart',
+    )
+
+    @classmethod
+    def setUpTestData(cls):
+        users = User.objects.bulk_create(
+            User(username=f'user{number}', email=f'user{number}@example.com')
+            for number in range(cls.USERS)
+        )
+        cls.user = users[0]
+        tags = [
+            Tag.objects.create(
+                id=tag_id, name=slug, color=f'#{tag_id:06}', slug=slug
+            )
+            # тег с id больше размера маски фильтруется через EXISTS
+            for tag_id, slug in ((1, 'breakfast'), (2, 'lunch'), (100, 'old'))
+        ]
+        recipes = Recipe.objects.bulk_create(
+            (
+                Recipe(
+                    author=users[number % cls.USERS],
+                    name=f'Рецепт {number}',
+                    text='Описание',
+                    image='recipes/images/image.png',
+                    cooking_time=10,
+                    tags_mask=get_tags_mask([number % 2 + 1]),
+                )
+                for number in range(cls.RECIPES)
+            ),
+            batch_size=1000,
+        )
+        RecipeTag.objects.bulk_create(
+            (
+                RecipeTag(recipe=recipe, tag=tags[number % 3])
+                for number, recipe in enumerate(recipes)
+            ),
+            batch_size=1000,
+        )
+        for model in (Favorite, ShoppingCart):
+            model.objects.bulk_create(
+                (
+                    model(user=user, recipe=recipes[number * 97 % cls.RECIPES])
+                    for user in users
+                    for number in range(user.id % 7, 500, 7)
+                ),
+                batch_size=1000,
+                ignore_conflicts=True,
+            )
+        Follow.objects.bulk_create(
+            Follow(user=author, following=follower)
+            for author in users[:10]
+            for follower in users[10:]
+        )
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def get_plan(self, **params):
+        request = Request(APIRequestFactory().get('/api/recipes/', params))
+        request.user = self.user
+        view = RecipeViewSet(
+            request=request, format_kwarg=None, action='list', kwargs={}
+        )
+        queryset = view.filter_queryset(view.get_queryset())
+        return queryset[:6].explain()
+
+    def assertIndexedPlan(self, **params):
+        plan = self.get_plan(**params)
+        for table in self.FILTERED_TABLES:
+            self.assertNotIn(f'Seq Scan on {table} ', plan)
+        # JOIN с DISTINCT или GROUP BY даёт один из этих узлов
+        for node in ('HashAggregate', 'GroupAggregate', 'Unique'):
+            self.assertNotIn(node, plan)
+
+    def test_tags_mask(self):
+        self.assertIndexedPlan(tags=['breakfast', 'lunch'])
+
+    def test_tags_exists(self):
+        self.assertIndexedPlan(tags=['breakfast', 'old'])
+
+    def test_is_favorited(self):
+        self.assertIndexedPlan(is_favorited=1)
+        self.assertIndexedPlan(is_favorited=0)
+
+    def test_is_in_shopping_cart(self):
+        self.assertIndexedPlan(is_in_shopping_cart=1)
+        self.assertIndexedPlan(is_in_shopping_cart=0)
@@ -6,6 +6,7 @@ from api.views import (
     TagViewSet,
     CustomUserViewSet,
     RecipeViewSet,
+    ShoppingListJobViewSet,
 )
 
 router = DefaultRouter()
@@ -14,6 +15,9 @@ router.register(r'ingredients', IngredientViewSet)
 router.register(r'tags', TagViewSet)
 router.register(r'users', CustomUserViewSet, basename='user')
 router.register(r'recipes', RecipeViewSet)
+router.register(
+    r'shopping_list_jobs', ShoppingListJobViewSet, basename='shopping_list_job'
+)
 
 
 urlpatterns = [
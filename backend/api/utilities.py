@@ -1,66 +1,296 @@
+import json
 import os
+from hashlib import sha256
 from io import BytesIO
+from tempfile import SpooledTemporaryFile
 
-from django.db.models import Sum
+from django.core.cache import caches
+from django.db import connections, router
+from django.db.models import Case, F, Prefetch, Value, When, Window
+from django.db.models.expressions import RawSQL
+from django.db.models.sql import InsertQuery
+from django.db.models.functions import Greatest, RowNumber
 from reportlab.lib.pagesizes import letter
 from reportlab.pdfbase import pdfmetrics
 from reportlab.pdfbase.ttfonts import TTFont
 from reportlab.pdfgen import canvas
-from reportlab.rl_settings import TTFSearchPath
 
-from backend.settings import FONTS_PATH
-from recipes.models import RecipeIngredient
+from backend.settings import FONTS_PATH, SHOPPING_LIST_CACHE_ITEM_SIZE
+from recipes.models import (
+    Recipe,
+    RecipeIngredient,
+    ShoppingCart,
+    ShoppingListItem,
+)
+from users.models import Follow, UserCounters
 
+SHOPPING_LIST_FONT = 'Consolas Bold'
+PDF_SPOOL_MAX_SIZE = 1024 * 1024
 
-def create_shopping_list(shopping_cart):
-    grouped_ingredients = (
-        RecipeIngredient.objects.filter(recipe__in=shopping_cart)
-        .values('ingredient__name', 'ingredient__measurement_unit')
-        .annotate(amount_sum=Sum('amount'))
+LINE_LENGTH = 70
+LINE_X = 80
+LINE_HEIGHT = 25
+FIRST_PAGE_TOP = 700
+PAGE_TOP = 725
+PAGE_BOTTOM = 50
+
+
+def limited_recipes_prefetch(authors, recipes_limit=None):
+    """Подгружает не больше recipes_limit последних рецептов
+    каждого автора одним запросом (ROW_NUMBER по автору)."""
+    recipes = Recipe.objects.only(
+        'id',
+        'name',
+        'image',
+        'renditions',
+        'cooking_time',
+        'author',
+        'created',
     )
+    if recipes_limit is not None:
+        ranked = (
+            Recipe.objects.filter(author__in=authors)
+            .annotate(
+                row_number=Window(
+                    expression=RowNumber(),
+                    partition_by=F('author'),
+                    order_by=F('created').desc(),
+                )
+            )
+            .order_by()
+            .values('id', 'row_number')
+        )
+        sql, params = ranked.query.sql_with_params()
+        recipes = recipes.filter(
+            id__in=RawSQL(
+                f'SELECT ranked.id FROM ({sql}) AS ranked '
+                'WHERE ranked.row_number <= %s',
+                (*params, recipes_limit),
+            )
+        )
+    return Prefetch('recipes', queryset=recipes, to_attr='limited_recipes')
+
+
+def recipe_amounts(recipe, sign=1):
+    """Количества ингредиентов рецепта (объекта или id)
+    {ingredient_id: amount}."""
+    return {
+        ingredient_id: sign * amount
+        for ingredient_id, amount in RecipeIngredient.objects.filter(
+            recipe=recipe
+        ).values_list('ingredient_id', 'amount')
+    }
 
-    shopping_list = {
-        ingredient['ingredient__name']: '%s %s'
-        % (
-            ingredient['amount_sum'],
-            ingredient['ingredient__measurement_unit'],
+
+def insert_ignore_conflicts(obj):
+    """Вставляет объект одним INSERT ... ON CONFLICT DO NOTHING.
+
+    Возвращает число вставленных строк: 0, если такая строка уже есть,
+    в том числе вставленная параллельным запросом. bulk_create с
+    ignore_conflicts этого числа не сообщает.
+    """
+    model = type(obj)
+    using = router.db_for_write(model)
+    fields = [
+        field
+        for field in model._meta.local_concrete_fields
+        if not field.primary_key
+    ]
+    query = InsertQuery(model, ignore_conflicts=True)
+    query.insert_values(fields, [obj])
+    inserted = 0
+    with connections[using].cursor() as cursor:
+        for sql, params in query.get_compiler(using).as_sql():
+            cursor.execute(sql, params)
+            inserted += cursor.rowcount
+    return inserted
+
+
+def update_shopping_lists(user_ids, deltas):
+    """Прибавляет deltas {ingredient_id: количество} к спискам покупок
+    пользователей. Вызывается в транзакции изменения корзины или рецепта.
+
+    Недостающие строки сначала вставляются с нулём (конфликты
+    игнорируются), затем все суммы меняются одним UPDATE, поэтому
+    параллельные изменения не теряются.
+    """
+    deltas = {
+        ingredient_id: delta
+        for ingredient_id, delta in deltas.items()
+        if ingredient_id is not None and delta
+    }
+    user_ids = list(user_ids)
+    if not user_ids or not deltas:
+        return
+    items = ShoppingListItem.objects.filter(
+        user_id__in=user_ids, ingredient_id__in=deltas
+    )
+    existing = set(items.values_list('user_id', 'ingredient_id'))
+    ShoppingListItem.objects.bulk_create(
+        [
+            ShoppingListItem(
+                user_id=user_id, ingredient_id=ingredient_id, amount_sum=0
+            )
+            for user_id in user_ids
+            for ingredient_id, delta in deltas.items()
+            if delta > 0 and (user_id, ingredient_id) not in existing
+        ],
+        ignore_conflicts=True,
+    )
+    items.update(
+        amount_sum=Greatest(
+            F('amount_sum')
+            + Case(
+                *(
+                    When(ingredient_id=ingredient_id, then=Value(delta))
+                    for ingredient_id, delta in deltas.items()
+                ),
+                default=Value(0),
+            ),
+            Value(0),
+        )
+    )
+    items.filter(amount_sum=0).delete()
+
+
+def change_counter(queryset, field, delta):
+    """Меняет счётчик на delta одним UPDATE, не опуская его ниже нуля.
+    Возвращает число изменённых строк."""
+    return queryset.update(**{field: Greatest(F(field) + delta, 0)})
+
+
+def change_user_counter(user_id, field, delta):
+    """Меняет счётчик пользователя после изменения данных.
+
+    Строки счётчиков нет у пользователей, созданных в обход сигнала
+    post_save (bulk_create, загрузка данных). Тогда она создаётся
+    со значениями, посчитанными по таблицам, в которых изменение уже
+    учтено.
+    """
+    counters = UserCounters.objects.filter(user_id=user_id)
+    if change_counter(counters, field, delta):
+        return
+    created = insert_ignore_conflicts(
+        UserCounters(
+            user_id=user_id,
+            recipes_count=Recipe.objects.filter(author_id=user_id).count(),
+            followers_count=Follow.objects.filter(user_id=user_id).count(),
         )
-        for ingredient in grouped_ingredients
+    )
+    if not created:
+        # строку успел создать параллельный запрос
+        change_counter(counters, field, delta)
+
+
+def update_recipe_in_shopping_lists(recipe, old_amounts, new_amounts=None):
+    """Переносит изменение ингредиентов рецепта в списки покупок
+    всех пользователей, у которых он в корзине."""
+    if new_amounts is None:
+        new_amounts = recipe_amounts(recipe)
+    deltas = {
+        ingredient_id: new_amounts.get(ingredient_id, 0)
+        - old_amounts.get(ingredient_id, 0)
+        for ingredient_id in {*old_amounts, *new_amounts}
     }
+    user_ids = ShoppingCart.objects.filter(recipe=recipe).values_list(
+        'user_id', flat=True
+    )
+    update_shopping_lists(user_ids, deltas)
 
-    return shopping_list
 
+def shopping_list_rows(user):
+    """Строки списка покупок (название, единица, количество)
+    из денормализованной таблицы ShoppingListItem."""
+    return (
+        ShoppingListItem.objects.filter(user=user)
+        .order_by('ingredient__name')
+        .values_list(
+            'ingredient__name', 'ingredient__measurement_unit', 'amount_sum'
+        )
+    )
 
-def generate_shopping_list_pdf(shopping_cart):
-    TTFSearchPath + (str(FONTS_PATH).replace(os.sep, '/'),)
-    buffer = BytesIO()
-    pdf = canvas.Canvas(buffer, pagesize=letter)
-    font = 'Consolas Bold'
-    pdfmetrics.registerFont(TTFont(font, 'consolab.ttf'))
-    pdf.setFont(font, 18)
 
-    pdf.drawCentredString(300, 750, 'Список покупок')
+def create_shopping_list(user):
+    return {
+        name: '%s %s' % (amount_sum, measurement_unit)
+        for name, measurement_unit, amount_sum in shopping_list_rows(user)
+    }
 
-    pdf.setFont(font, 12)
 
-    string_length = 70
-    x = 80
-    y = 700
+def register_fonts():
+    """Регистрирует шрифт списка покупок, вызывается один раз
+    при старте приложения."""
+    pdfmetrics.registerFont(
+        TTFont(SHOPPING_LIST_FONT, str(FONTS_PATH / 'consolab.ttf'))
+    )
+
+
+def layout_shopping_list(shopping_cart):
+    """Раскладывает строки списка покупок по страницам.
 
-    for count, (item, amount) in enumerate(shopping_cart.items()):
-        count += 1
-        dots_count = string_length - (
+    Возвращает список страниц, каждая — список пар (y, строка).
+    """
+    pages = [[]]
+    y = FIRST_PAGE_TOP
+
+    for count, (item, amount) in enumerate(shopping_cart.items(), 1):
+        if y <= PAGE_BOTTOM:
+            pages.append([])
+            y = PAGE_TOP
+        dots_count = LINE_LENGTH - (
             len(str(count)) + len(item.capitalize()) + len(amount) + 4
         )
         line = f'{count}. {item.capitalize()} {"." * dots_count} {amount}'
-        pdf.drawString(x, y, line)
-        y -= 25
-        if y <= 50:
-            pdf.showPage()
-            pdf.setFont(font, 12)
-            y = 725
-
-    pdf.showPage()
+        pages[-1].append((y, line))
+        y -= LINE_HEIGHT
+
+    return pages
+
+
+def generate_shopping_list_pdf(shopping_cart):
+    """Возвращает файл с PDF, который остаётся в памяти, пока он
+    небольшой, и сбрасывается на диск, если вырос."""
+    pages = layout_shopping_list(shopping_cart)
+    file = SpooledTemporaryFile(max_size=PDF_SPOOL_MAX_SIZE)
+    pdf = canvas.Canvas(file, pagesize=letter)
+
+    pdf.setFont(SHOPPING_LIST_FONT, 18)
+    pdf.drawCentredString(300, 750, 'Список покупок')
+
+    for lines in pages:
+        pdf.setFont(SHOPPING_LIST_FONT, 12)
+        for y, line in lines:
+            pdf.drawString(LINE_X, y, line)
+        pdf.showPage()
+
     pdf.save()
-    buffer.seek(0)
-    return buffer
+    file.seek(0)
+    return file
+
+
+def shopping_list_digest(shopping_cart):
+    return sha256(
+        json.dumps(shopping_cart, ensure_ascii=False).encode()
+    ).hexdigest()
+
+
+def get_shopping_list_pdf(shopping_cart):
+    """Отдаёт PDF из кэша по хэшу содержимого списка покупок.
+
+    Одинаковые списки разных пользователей делят одну запись, а любое
+    изменение корзины меняет содержимое и, значит, ключ. Большие файлы
+    не кэшируются, чтобы кэш не занимал много памяти.
+    """
+    cache = caches['shopping_lists']
+    key = shopping_list_digest(shopping_cart)
+    content = cache.get(key)
+    if content is not None:
+        return BytesIO(content)
+
+    file = generate_shopping_list_pdf(shopping_cart)
+    size = file.seek(0, os.SEEK_END)
+    file.seek(0)
+    if size <= SHOPPING_LIST_CACHE_ITEM_SIZE:
+        cache.set(key, file.read())
+        file.seek(0)
+    return file
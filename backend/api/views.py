@@ -1,55 +1,132 @@
+from datetime import timedelta
 from urllib.parse import unquote
 
-from django.http import HttpResponse
+from django.conf import settings
+from django.db import transaction
+from django.db.models import (
+    Avg,
+    BooleanField,
+    Case,
+    Exists,
+    F,
+    IntegerField,
+    OuterRef,
+    Prefetch,
+    Q,
+    Value,
+    When,
+    prefetch_related_objects,
+)
+from django.db.models.functions import Coalesce
+from django.http import FileResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
+from django.utils import timezone
 from django_filters.rest_framework import DjangoFilterBackend
 from djoser.views import UserViewSet
-from rest_framework import viewsets, status
+from rest_framework import mixins, viewsets, status
 from rest_framework.decorators import action
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.viewsets import ReadOnlyModelViewSet
 
 from api.filters import RecipeFilter
+from api.mixins import VersionedCacheMixin
 from api.pagination import RecipesPagination, UsersPagination
 from api.permissions import (
     ReadOnly,
     OwnerOrReadOnly,
     IsRetrieveAuthenticatedOrReadOnly,
 )
+from api.renderers import (
+    CSVRenderer,
+    JSONShoppingListRenderer,
+    PDFRenderer,
+    PlainTextRenderer,
+)
+from api.search import ingredient_index
 from api.serializers import (
     TagSerializer,
     IngredientSerializer,
     RecipeSerializer,
     ReducedRecipeSerializer,
     FollowSerializer,
+    ShoppingListJobSerializer,
+)
+from api.utilities import (
+    change_counter,
+    change_user_counter,
+    create_shopping_list,
+    get_shopping_list_pdf,
+    insert_ignore_conflicts,
+    limited_recipes_prefetch,
+    recipe_amounts,
+    shopping_list_rows,
+    update_shopping_lists,
+)
+from recipes.models import (
+    Tag,
+    Ingredient,
+    Recipe,
+    RecipeIngredient,
+    Favorite,
+    ShoppingCart,
+    ShoppingListJob,
 )
-from api.utilities import create_shopping_list, generate_shopping_list_pdf
-from recipes.models import Tag, Ingredient, Recipe, Favorite, ShoppingCart
+from recipes.renditions import schedule_renditions
 from users.models import Follow, User
 
 
-class TagViewSet(ReadOnlyModelViewSet):
+class TagViewSet(VersionedCacheMixin, ReadOnlyModelViewSet):
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
     permission_classes = (ReadOnly,)
     pagination_class = None
+    versioned_models = (Tag,)
 
 
-class IngredientViewSet(ReadOnlyModelViewSet):
+class IngredientViewSet(VersionedCacheMixin, ReadOnlyModelViewSet):
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
     permission_classes = (ReadOnly,)
     pagination_class = None
+    versioned_models = (Ingredient,)
 
     def get_queryset(self):
         queryset = super().get_queryset()
         search_name = self.request.GET.get('name')
         if search_name:
             decoded_name = unquote(search_name)
-            queryset = queryset.filter(name__contains=decoded_name)
+            # совпадения с начала названия выше совпадений в середине
+            queryset = (
+                queryset.filter(name__icontains=decoded_name)
+                .annotate(
+                    match_rank=Case(
+                        When(name__istartswith=decoded_name, then=Value(0)),
+                        default=Value(1),
+                        output_field=IntegerField(),
+                    )
+                )
+                .order_by('match_rank', 'name')
+            )
+        limit = self.get_limit()
+        if self.action == 'list' and limit is not None:
+            queryset = queryset[:limit]
         return queryset
 
+    def get_limit(self):
+        limit = self.request.GET.get('limit')
+        if limit and limit.isdigit():
+            return int(limit)
+        return None
+
+    def list(self, request, *args, **kwargs):
+        search_name = request.GET.get('name')
+        if search_name and settings.INGREDIENT_SEARCH_IN_MEMORY:
+            return Response(
+                ingredient_index.search(unquote(search_name), self.get_limit())
+            )
+        return super().list(request, *args, **kwargs)
+
 
 class RecipeViewSet(viewsets.ModelViewSet):
     queryset = Recipe.objects.all()
@@ -59,51 +136,105 @@ class RecipeViewSet(viewsets.ModelViewSet):
     filterset_class = RecipeFilter
     filter_backends = (DjangoFilterBackend,)
 
+    @transaction.atomic
     def perform_create(self, serializer):
-        serializer.save(author=self.request.user)
+        recipe = serializer.save(author=self.request.user)
+        change_user_counter(self.request.user.id, 'recipes_count', 1)
+        schedule_renditions(recipe.id)
+
+    def perform_update(self, serializer):
+        if 'image' not in serializer.validated_data:
+            serializer.save()
+            return
+        # старые копии относятся к прежней картинке
+        recipe = serializer.save(renditions={})
+        schedule_renditions(recipe.id)
+
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        instance.delete()
+        change_user_counter(instance.author_id, 'recipes_count', -1)
 
     def get_queryset(self):
         query_params = self.request.query_params
-        recipes = self.queryset
         user = self.request.user
+        recipes = self.queryset.select_related('author').prefetch_related(
+            'tags',
+            Prefetch(
+                'recipe_ingredients',
+                queryset=RecipeIngredient.objects.select_related(
+                    'ingredient'
+                ),
+            ),
+        )
+
+        if user.is_authenticated:
+            recipes = recipes.annotate(
+                is_favorited=Exists(
+                    Favorite.objects.filter(user=user, recipe=OuterRef('pk'))
+                ),
+                is_in_shopping_cart=Exists(
+                    ShoppingCart.objects.filter(
+                        user=user, recipe=OuterRef('pk')
+                    )
+                ),
+                is_author_subscribed=Exists(
+                    Follow.objects.filter(
+                        user=OuterRef('author'), following=user
+                    )
+                ),
+            )
 
         is_favorited = query_params.get('is_favorited')
         is_in_shopping_cart = query_params.get('is_in_shopping_cart')
 
+        # для анонима user.id равен None, и подзапросы ничего не находят
         if is_favorited:
-            is_favorited_value = bool(int(is_favorited))
-            if is_favorited_value:
-                recipes = recipes.filter(favorites__user=user)
-            else:
-                recipes = recipes.exclude(favorites__user=user)
+            favorited = Exists(
+                Favorite.objects.filter(user_id=user.id, recipe=OuterRef('pk'))
+            )
+            recipes = recipes.filter(
+                favorited if bool(int(is_favorited)) else ~favorited
+            )
 
         if is_in_shopping_cart:
-            is_in_shopping_cart_value = bool(int(is_in_shopping_cart))
-            if is_in_shopping_cart_value:
-                recipes = recipes.filter(shoppingcart__user=user)
-            else:
-                recipes = recipes.exclude(shoppingcart__user=user)
+            in_shopping_cart = Exists(
+                ShoppingCart.objects.filter(
+                    user_id=user.id, recipe=OuterRef('pk')
+                )
+            )
+            recipes = recipes.filter(
+                in_shopping_cart
+                if bool(int(is_in_shopping_cart))
+                else ~in_shopping_cart
+            )
 
         return recipes
 
-    def add_or_remove_recipe(self, request, recipe, model, instance):
-        is_exists = instance.exists()
+    def add_or_remove_recipe(self, request, pk, model):
+        """Добавляет рецепт одним INSERT ... ON CONFLICT DO NOTHING или
+        убирает его одним DELETE; ответ выбирается по числу затронутых
+        строк, поэтому параллельные запросы не приводят к ошибке 500."""
         if request.method == 'POST':
-            if is_exists:
+            recipe = get_object_or_404(Recipe, id=pk)
+            if not insert_ignore_conflicts(
+                model(user=request.user, recipe=recipe)
+            ):
                 return Response(
                     {'error': 'Рецепт уже добавлен'},
                     status=status.HTTP_400_BAD_REQUEST,
                 )
-            obj = model(user=request.user, recipe=recipe)
-            obj.save()
             serializer = ReducedRecipeSerializer(recipe)
             return Response(serializer.data, status=status.HTTP_201_CREATED)
-        if not is_exists:
+        deleted, _ = model.objects.filter(
+            user=request.user, recipe_id=pk
+        ).delete()
+        if not deleted:
+            get_object_or_404(Recipe, id=pk)
             return Response(
                 {'errors': 'Рецепт ещё не добавлен'},
                 status=status.HTTP_400_BAD_REQUEST,
             )
-        instance.delete()
         return Response(status=status.HTTP_204_NO_CONTENT)
 
     @action(
@@ -112,9 +243,15 @@ class RecipeViewSet(viewsets.ModelViewSet):
         permission_classes=[IsAuthenticated],
     )
     def favorite(self, request, pk=None):
-        recipe = get_object_or_404(Recipe, id=pk)
-        favorite = request.user.favorites.filter(recipe=recipe)
-        return self.add_or_remove_recipe(request, recipe, Favorite, favorite)
+        with transaction.atomic():
+            response = self.add_or_remove_recipe(request, pk, Favorite)
+            if status.is_success(response.status_code):
+                change_counter(
+                    Recipe.objects.filter(pk=pk),
+                    'favorites_count',
+                    1 if request.method == 'POST' else -1,
+                )
+        return response
 
     @action(
         detail=True,
@@ -122,23 +259,130 @@ class RecipeViewSet(viewsets.ModelViewSet):
         permission_classes=[IsAuthenticated],
     )
     def shopping_cart(self, request, pk=None):
-        recipe = get_object_or_404(Recipe, id=pk)
-        shopping_cart = request.user.shopping_cart.filter(recipe=recipe)
-        return self.add_or_remove_recipe(
-            request, recipe, ShoppingCart, shopping_cart
-        )
+        with transaction.atomic():
+            # блокировка рецепта упорядочивает изменения корзины
+            # и правку его ингредиентов
+            list(Recipe.objects.select_for_update().filter(pk=pk))
+            response = self.add_or_remove_recipe(request, pk, ShoppingCart)
+            # удаление учитывается сигналом, вставка идёт в обход save()
+            if request.method == 'POST' and status.is_success(
+                response.status_code
+            ):
+                update_shopping_lists([request.user.id], recipe_amounts(pk))
+        return response
 
     @action(
-        detail=False, methods=['get'], permission_classes=[IsAuthenticated]
+        detail=False,
+        methods=['get'],
+        permission_classes=[IsAuthenticated],
+        renderer_classes=[
+            PDFRenderer,
+            PlainTextRenderer,
+            CSVRenderer,
+            JSONShoppingListRenderer,
+        ],
     )
     def download_shopping_cart(self, request):
-        shopping_cart = Recipe.objects.filter(shoppingcart__user=request.user)
-        shopping_list = create_shopping_list(shopping_cart)
-        filename = f'{request.user.username}_shopping_list.pdf'
-        file = generate_shopping_list_pdf(shopping_list)
-        response = HttpResponse(file, content_type='application/pdf')
-        response['Content-Disposition'] = f'attachment; filename={filename}'
-        return response
+        renderer = request.accepted_renderer
+        filename = f'{request.user.username}_shopping_list.{renderer.format}'
+        if renderer.format != PDFRenderer.format:
+            response = StreamingHttpResponse(
+                renderer.stream(shopping_list_rows(request.user).iterator()),
+                content_type=f'{renderer.media_type}; charset=utf-8',
+            )
+            response['Content-Disposition'] = (
+                f'attachment; filename="{filename}"'
+            )
+            return response
+
+        shopping_list = create_shopping_list(request.user)
+        file = get_shopping_list_pdf(shopping_list)
+        return FileResponse(
+            file,
+            as_attachment=True,
+            filename=filename,
+            content_type='application/pdf',
+        )
+
+
+class ShoppingListJobViewSet(
+    mixins.CreateModelMixin,
+    mixins.RetrieveModelMixin,
+    viewsets.GenericViewSet,
+):
+    """Фоновая генерация списка покупок: POST ставит задание
+    в очередь, GET по id показывает статус, download отдаёт файл."""
+
+    serializer_class = ShoppingListJobSerializer
+    permission_classes = (IsAuthenticated,)
+
+    def get_queryset(self):
+        return self.request.user.shopping_list_jobs.all()
+
+    def create(self, request, *args, **kwargs):
+        # задание, зависшее в RUNNING, не переиспользуется
+        deadline = timezone.now() - timedelta(
+            seconds=settings.SHOPPING_LIST_JOB_TIMEOUT
+        )
+        job = self.get_queryset().filter(
+            Q(status=ShoppingListJob.PENDING)
+            | Q(status=ShoppingListJob.RUNNING, started__gte=deadline)
+        ).first() or ShoppingListJob.objects.create(user=request.user)
+        serializer = self.get_serializer(job)
+        return Response(serializer.data, status=status.HTTP_202_ACCEPTED)
+
+    @action(detail=True, methods=['get'])
+    def download(self, request, pk=None):
+        job = self.get_object()
+        if job.status != ShoppingListJob.DONE:
+            return Response(
+                {'errors': 'Список покупок ещё не готов'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        return FileResponse(
+            job.file.open('rb'),
+            as_attachment=True,
+            filename=f'{request.user.username}_shopping_list.pdf',
+            content_type='application/pdf',
+        )
+
+    @action(detail=False, methods=['get'], permission_classes=[IsAdminUser])
+    def stats(self, request):
+        jobs = ShoppingListJob.objects.all()
+        oldest = (
+            jobs.filter(status=ShoppingListJob.PENDING)
+            .order_by('created')
+            .values_list('created', flat=True)
+            .first()
+        )
+        latency = jobs.filter(
+            status=ShoppingListJob.DONE,
+            finished__gte=timezone.now() - timedelta(hours=1),
+        ).aggregate(
+            wait=Avg(F('started') - F('created')),
+            render=Avg(F('finished') - F('started')),
+        )
+        return Response(
+            {
+                'pending': jobs.filter(status=ShoppingListJob.PENDING).count(),
+                'running': jobs.filter(status=ShoppingListJob.RUNNING).count(),
+                'oldest_pending_age': (
+                    (timezone.now() - oldest).total_seconds()
+                    if oldest
+                    else None
+                ),
+                'avg_wait': (
+                    latency['wait'].total_seconds()
+                    if latency['wait']
+                    else None
+                ),
+                'avg_render': (
+                    latency['render'].total_seconds()
+                    if latency['render']
+                    else None
+                ),
+            }
+        )
 
 
 class CustomUserViewSet(UserViewSet):
@@ -162,11 +406,23 @@ class CustomUserViewSet(UserViewSet):
         detail=False, methods=['get'], permission_classes=[IsAuthenticated]
     )
     def subscriptions(self, request):
-        follows = Follow.objects.filter(following=request.user)
-        followers = User.objects.filter(
-            id__in=follows.values('user')
-        ).order_by('-follower__created')
+        followers = (
+            User.objects.filter(follower__following=request.user)
+            .annotate(
+                recipes_count=Coalesce('counters__recipes_count', 0),
+                is_subscribed=Value(True, output_field=BooleanField()),
+            )
+            .order_by('-follower__created')
+        )
         paginator = self.paginate_queryset(followers)
+        recipes_limit = request.query_params.get('recipes_limit')
+        prefetch_related_objects(
+            paginator,
+            limited_recipes_prefetch(
+                paginator,
+                int(recipes_limit) if recipes_limit else None,
+            ),
+        )
         serializer = FollowSerializer(
             paginator, many=True, context={'request': request}
         )
@@ -179,26 +435,39 @@ class CustomUserViewSet(UserViewSet):
     )
     def subscribe(self, request, id=None):
         follower = request.user
-        following = get_object_or_404(User, id=id)
-        follow = Follow.objects.filter(user=following, following=follower)
         if request.method == 'POST':
-            if follower == following or follow.exists():
+            following = get_object_or_404(User, id=id)
+            if follower == following:
                 return Response(
                     {'errors': 'Нельзя подписаться на самого себя'},
                     status=status.HTTP_400_BAD_REQUEST,
                 )
-
-            follow = Follow(user=following, following=follower)
-            follow.save()
+            with transaction.atomic():
+                created = insert_ignore_conflicts(
+                    Follow(user=following, following=follower)
+                )
+                if created:
+                    change_user_counter(following.id, 'followers_count', 1)
+            if not created:
+                return Response(
+                    {'errors': 'Вы уже подписаны на этого пользователя'},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
             serializer = FollowSerializer(
                 following, context={'request': request}
             )
             return Response(serializer.data, status=status.HTTP_201_CREATED)
 
-        if not follow.exists():
+        with transaction.atomic():
+            deleted, _ = Follow.objects.filter(
+                user_id=id, following=follower
+            ).delete()
+            if deleted:
+                change_user_counter(id, 'followers_count', -1)
+        if not deleted:
+            get_object_or_404(User, id=id)
             return Response(
                 {'errors': 'Ошибка отписки'},
                 status=status.HTTP_400_BAD_REQUEST,
             )
-        follow.delete()
         return Response(status=status.HTTP_204_NO_CONTENT)
@@ -103,10 +103,33 @@ STATIC_ROOT = BASE_DIR / 'static'
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+# файлы пользователей, которые отдаются только через API
+PRIVATE_MEDIA_ROOT = os.getenv(
+    'PRIVATE_MEDIA_ROOT', os.path.join(BASE_DIR, 'private_media')
+)
 
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'shopping_lists': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'shopping-lists',
+        'TIMEOUT': None,
+        'OPTIONS': {
+            'MAX_ENTRIES': int(os.getenv('SHOPPING_LIST_CACHE_SIZE', 100)),
+        },
+    },
+}
+# PDF крупнее этого размера не кэшируется: кэш занимает не больше
+# MAX_ENTRIES * SHOPPING_LIST_CACHE_ITEM_SIZE байт в каждом воркере
+SHOPPING_LIST_CACHE_ITEM_SIZE = int(
+    os.getenv('SHOPPING_LIST_CACHE_ITEM_SIZE', 64 * 1024)
+)
+
 REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
@@ -132,3 +155,27 @@ DJOSER = {
 }
 
 FONTS_PATH = BASE_DIR / 'fonts'
+
+# поиск по копии таблицы ингредиентов в памяти каждого воркера,
+# по умолчанию выключен: ищет база по триграммному индексу
+INGREDIENT_SEARCH_IN_MEMORY = (
+    os.getenv('INGREDIENT_SEARCH_IN_MEMORY', 'False') == 'True'
+)
+INGREDIENT_INDEX_CHECK_INTERVAL = int(
+    os.getenv('INGREDIENT_INDEX_CHECK_INTERVAL', 5)
+)
+
+MAX_IMAGE_UPLOAD_SIZE = int(
+    os.getenv('MAX_IMAGE_UPLOAD_SIZE', 10 * 1024 * 1024)
+)
+MAX_IMAGE_PIXELS = int(os.getenv('MAX_IMAGE_PIXELS', 25_000_000))
+
+IMAGE_RENDITION_WORKERS = int(os.getenv('IMAGE_RENDITION_WORKERS', 2))
+
+# задание, которое выполняется дольше, считается брошенным воркером
+SHOPPING_LIST_JOB_TIMEOUT = int(os.getenv('SHOPPING_LIST_JOB_TIMEOUT', 300))
+
+PAGINATION_COUNT_CACHE_TTL = int(os.getenv('PAGINATION_COUNT_CACHE_TTL', 10))
+APPROXIMATE_COUNT_THRESHOLD = int(
+    os.getenv('APPROXIMATE_COUNT_THRESHOLD', 100_000)
+)
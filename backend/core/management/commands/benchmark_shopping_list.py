@@ -0,0 +1,55 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand
+
+from api.utilities import generate_shopping_list_pdf, register_fonts
+
+
+class Command(BaseCommand):
+    """Замеряет процессорное время генерации PDF списка покупок.
+    шаблон: python manage.py benchmark_shopping_list [--items 60]
+    Сравнивает генерацию с регистрацией шрифта на каждый запрос,
+    как было раньше, и с шрифтом, зарегистрированным при старте.
+    Кэш PDF не используется.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--items',
+            type=int,
+            default=60,
+            help='Количество строк в списке покупок',
+        )
+        parser.add_argument(
+            '--runs',
+            type=int,
+            default=50,
+            help='Количество генераций для каждого варианта',
+        )
+
+    def measure(self, shopping_list, runs, register_each_time):
+        size = 0
+        started = time.process_time()
+        for _ in range(runs):
+            if register_each_time:
+                register_fonts()
+            file = generate_shopping_list_pdf(shopping_list)
+            size = file.seek(0, os.SEEK_END)
+        return (time.process_time() - started) / runs * 1000, size
+
+    def handle(self, *args, **options):
+        shopping_list = {
+            f'ингредиент {number}': f'{number * 10} г'
+            for number in range(1, options['items'] + 1)
+        }
+        for title, register_each_time in (
+            ('шрифт на каждый запрос', True),
+            ('шрифт зарегистрирован один раз', False),
+        ):
+            cpu, size = self.measure(
+                shopping_list, options['runs'], register_each_time
+            )
+            self.stdout.write(
+                f'{title}: {cpu:.1f} мс CPU на документ, {size} байт'
+            )
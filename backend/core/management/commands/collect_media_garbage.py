@@ -0,0 +1,92 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    """Удаляет картинки рецептов, на которые не ссылается ни один рецепт.
+    шаблон: python manage.py collect_media_garbage [--dry-run]
+    Файлы остаются после удаления рецептов и замены картинок.
+    Свежие файлы не трогаются: их мог только что сохранить запрос,
+    транзакция которого ещё не завершена. Перед удалением каждый файл
+    ещё раз ищется в базе: пока шёл обход, на старый файл мог
+    сослаться новый рецепт.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Только показать, какие файлы будут удалены',
+        )
+        parser.add_argument(
+            '--min-age',
+            type=int,
+            default=24 * 60 * 60,
+            help='Не удалять файлы моложе этого числа секунд',
+        )
+
+    def referenced_names(self):
+        names = set()
+        for image, renditions in Recipe.objects.values_list(
+            'image', 'renditions'
+        ).iterator():
+            names.add(image)
+            for items in renditions.values():
+                names.update(name for _, name in items)
+        return names
+
+    def is_referenced(self, name):
+        # имена файлов — хэши, поэтому поиск подстрокой в JSON точен
+        return Recipe.objects.filter(
+            Q(image=name) | Q(renditions__icontains=name)
+        ).exists()
+
+    def handle(self, *args, **options):
+        field = Recipe._meta.get_field('image')
+        storage = field.storage
+        directory = field.upload_to
+        if not storage.exists(directory):
+            self.stdout.write(self.style.SUCCESS('Удалено файлов: 0'))
+            return
+        # список ссылок читается после списка файлов, чтобы файл,
+        # сохранённый между двумя чтениями, не посчитался лишним
+        _, file_names = storage.listdir(directory)
+        referenced = self.referenced_names()
+        deadline = time.time() - options['min_age']
+
+        removed = freed = 0
+        for file_name in file_names:
+            name = os.path.join(directory, file_name)
+            if name in referenced:
+                continue
+            path = storage.path(name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            if stat.st_mtime > deadline or self.is_referenced(name):
+                continue
+            if options['dry_run']:
+                self.stdout.write(name)
+            else:
+                try:
+                    # файл могли переиспользовать после первой проверки
+                    if os.stat(path).st_mtime != stat.st_mtime:
+                        continue
+                except FileNotFoundError:
+                    continue
+                storage.delete(name)
+            removed += 1
+            freed += stat.st_size
+
+        action = 'Будет удалено' if options['dry_run'] else 'Удалено'
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'{action} файлов: {removed} ({freed / 1024 / 1024:.1f} МБ)'
+            )
+        )
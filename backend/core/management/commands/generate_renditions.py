@@ -0,0 +1,48 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from recipes.models import Recipe
+from recipes.renditions import run_in_background
+
+
+class Command(BaseCommand):
+    """Создаёт уменьшенные копии картинок для уже загруженных рецептов.
+    шаблон: python manage.py generate_renditions [--all]
+    По умолчанию обрабатываются только рецепты без копий.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='Пересоздать копии для всех рецептов',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=settings.IMAGE_RENDITION_WORKERS,
+            help='Количество потоков',
+        )
+
+    def handle(self, *args, **options):
+        recipes = Recipe.objects.exclude(image='')
+        if not options['all']:
+            recipes = recipes.filter(renditions={})
+        recipe_ids = list(recipes.values_list('id', flat=True))
+
+        with ThreadPoolExecutor(max_workers=options['workers']) as executor:
+            for number, _ in enumerate(
+                executor.map(run_in_background, recipe_ids), 1
+            ):
+                if number % 100 == 0:
+                    self.stdout.write(f'Обработано рецептов: {number}')
+
+        done = Recipe.objects.filter(id__in=recipe_ids).exclude(renditions={})
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Копии созданы для {done.count()} из {len(recipe_ids)} '
+                'рецептов'
+            )
+        )
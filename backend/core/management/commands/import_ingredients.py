@@ -0,0 +1,83 @@
+import csv
+import os
+from itertools import islice
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from backend.settings import BASE_DIR
+from core.models import TableVersion
+from core.utils import iter_json_array
+from recipes.models import Ingredient
+
+data_path = BASE_DIR / 'data'
+
+
+class Command(BaseCommand):
+    """Идемпотентный импорт ингредиентов из csv или json файла.
+    шаблон: python manage.py import_ingredients ingredients.json
+    Ингредиент определяется парой (название, мера): уже существующие
+    пары пропускаются через INSERT ... ON CONFLICT DO NOTHING, поэтому
+    команду можно безопасно запускать повторно.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'file',
+            help='Имя файла в папке data или путь к нему (.csv или .json)',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Количество строк в одном INSERT',
+        )
+
+    def read_csv(self, file):
+        for row in csv.reader(file):
+            if len(row) >= 2:
+                yield row[0], row[1]
+
+    def read_json(self, file):
+        for item in iter_json_array(file):
+            yield item['name'], item['measurement_unit']
+
+    def handle(self, *args, **options):
+        file_path = os.path.join(data_path, options['file'])
+        extension = os.path.splitext(file_path)[1].lower()
+        readers = {'.csv': self.read_csv, '.json': self.read_json}
+        if extension not in readers:
+            raise CommandError('Поддерживаются только файлы .csv и .json.')
+
+        try:
+            with open(file_path, 'r', encoding='utf-8', newline='') as file:
+                rows = readers[extension](file)
+                before = Ingredient.objects.count()
+                read = 0
+                with transaction.atomic():
+                    while True:
+                        batch = [
+                            Ingredient(
+                                name=name.strip(),
+                                measurement_unit=measurement_unit.strip(),
+                            )
+                            for name, measurement_unit in islice(
+                                rows, options['batch_size']
+                            )
+                        ]
+                        if not batch:
+                            break
+                        Ingredient.objects.bulk_create(
+                            batch, ignore_conflicts=True
+                        )
+                        read += len(batch)
+                    TableVersion.bump(Ingredient._meta.db_table)
+        except FileNotFoundError:
+            raise CommandError(f'Файл {file_path} не найден.')
+
+        created = Ingredient.objects.count() - before
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Прочитано записей: {read}, добавлено новых: {created}'
+            )
+        )
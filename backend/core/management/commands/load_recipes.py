@@ -0,0 +1,168 @@
+import os
+import time
+from collections import Counter
+from itertools import islice
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from api.utilities import change_user_counter
+from backend.settings import BASE_DIR
+from core.utils import iter_json_array
+from recipes.models import (
+    Ingredient,
+    Recipe,
+    RecipeIngredient,
+    RecipeTag,
+    Tag,
+    get_tags_mask,
+)
+from users.models import User
+
+data_path = BASE_DIR / 'data'
+
+
+class Command(BaseCommand):
+    """Загрузка рецептов с тегами и ингредиентами из json файла.
+    шаблон: python manage.py load_recipes recipes.json
+    Файл — массив объектов вида
+    {"author": "email", "name": "...", "text": "...", "cooking_time": 10,
+     "image": "recipes/images/file.jpg", "tags": ["slug"],
+     "ingredients": [{"name": "...", "measurement_unit": "г", "amount": 1}]}
+    Автор, теги и ингредиенты ищутся по email, slug и названию
+    в словарях, загруженных один раз, а рецепты и их связи
+    вставляются пачками через bulk_create в одной транзакции,
+    там же увеличиваются счётчики рецептов авторов.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'file', help='Имя json файла в папке data или путь к нему'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Количество рецептов в одной пачке',
+        )
+
+    def load_references(self):
+        self.authors = dict(User.objects.values_list('email', 'id'))
+        self.tags = dict(Tag.objects.values_list('slug', 'id'))
+        self.ingredients = {}
+        self.ingredients_by_name = {}
+        for pk, name, measurement_unit in Ingredient.objects.values_list(
+            'id', 'name', 'measurement_unit'
+        ).iterator():
+            self.ingredients[(name, measurement_unit)] = pk
+            # название без меры однозначно, только если оно встречается раз
+            self.ingredients_by_name[name] = (
+                None if name in self.ingredients_by_name else pk
+            )
+
+    def resolve_ingredient(self, item):
+        if 'measurement_unit' in item:
+            return self.ingredients.get(
+                (item['name'], item['measurement_unit'])
+            )
+        return self.ingredients_by_name.get(item['name'])
+
+    def build_recipe(self, number, data):
+        try:
+            author_id = self.authors.get(data['author'])
+            if author_id is None:
+                raise CommandError(
+                    f'Рецепт {number}: нет пользователя {data["author"]}.'
+                )
+            tag_ids = []
+            for slug in data.get('tags', ()):
+                if slug not in self.tags:
+                    raise CommandError(f'Рецепт {number}: нет тега {slug}.')
+                tag_ids.append(self.tags[slug])
+            amounts = {}
+            for item in data['ingredients']:
+                ingredient_id = self.resolve_ingredient(item)
+                if ingredient_id is None:
+                    raise CommandError(
+                        f'Рецепт {number}: ингредиент {item["name"]} '
+                        'не найден или неоднозначен.'
+                    )
+                if ingredient_id in amounts:
+                    raise CommandError(
+                        f'Рецепт {number}: ингредиент {item["name"]} '
+                        'указан дважды.'
+                    )
+                amounts[ingredient_id] = item['amount']
+            recipe = Recipe(
+                author_id=author_id,
+                name=data['name'],
+                text=data['text'],
+                cooking_time=data['cooking_time'],
+                image=data.get('image', ''),
+                tags_mask=get_tags_mask(tag_ids),
+            )
+        except KeyError as error:
+            raise CommandError(f'Рецепт {number}: нет поля {error}.')
+        return recipe, set(tag_ids), amounts
+
+    def load_batch(self, batch):
+        Recipe.objects.bulk_create([recipe for recipe, _, _ in batch])
+        RecipeTag.objects.bulk_create(
+            [
+                RecipeTag(recipe_id=recipe.id, tag_id=tag_id)
+                for recipe, tag_ids, _ in batch
+                for tag_id in tag_ids
+            ]
+        )
+        RecipeIngredient.objects.bulk_create(
+            [
+                RecipeIngredient(
+                    recipe_id=recipe.id,
+                    ingredient_id=ingredient_id,
+                    amount=amount,
+                )
+                for recipe, _, amounts in batch
+                for ingredient_id, amount in amounts.items()
+            ]
+        )
+        authors = Counter(recipe.author_id for recipe, _, _ in batch)
+        for author_id, count in authors.items():
+            change_user_counter(author_id, 'recipes_count', count)
+
+    def handle(self, *args, **options):
+        if not connection.features.can_return_rows_from_bulk_insert:
+            raise CommandError(
+                'База данных должна возвращать id из bulk_create '
+                '(PostgreSQL).'
+            )
+        file_path = os.path.join(data_path, options['file'])
+        self.load_references()
+
+        started = time.monotonic()
+        loaded = 0
+        try:
+            with open(
+                file_path, 'r', encoding='utf-8'
+            ) as file, transaction.atomic():
+                records = enumerate(iter_json_array(file), 1)
+                while True:
+                    batch = [
+                        self.build_recipe(number, data)
+                        for number, data in islice(
+                            records, options['batch_size']
+                        )
+                    ]
+                    if not batch:
+                        break
+                    self.load_batch(batch)
+                    loaded += len(batch)
+                    rate = loaded / max(time.monotonic() - started, 1e-6)
+                    self.stdout.write(
+                        f'Загружено рецептов: {loaded} ({rate:.0f} в секунду)'
+                    )
+        except FileNotFoundError:
+            raise CommandError(f'Файл {file_path} не найден.')
+
+        self.stdout.write(
+            self.style.SUCCESS(f'Рецепты загружены из {file_path}: {loaded}')
+        )
@@ -0,0 +1,112 @@
+from collections import Counter
+from itertools import islice
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Sum
+
+from recipes.models import RecipeIngredient, ShoppingListItem
+
+
+class Command(BaseCommand):
+    """Сверяет таблицу ShoppingListItem с корзинами пользователей
+    и пересобирает её с нуля.
+    шаблон: python manage.py rebuild_shopping_lists [--dry-run]
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Только показать расхождения, не пересобирая таблицу',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Размер пачки при вставке строк',
+        )
+
+    def expected_rows(self):
+        return (
+            RecipeIngredient.objects.filter(
+                recipe__shoppingcart__isnull=False, ingredient__isnull=False
+            )
+            .values('recipe__shoppingcart__user', 'ingredient')
+            .annotate(amount_sum=Sum('amount'))
+            .order_by('recipe__shoppingcart__user', 'ingredient')
+            .values_list(
+                'recipe__shoppingcart__user', 'ingredient', 'amount_sum'
+            )
+        )
+
+    def actual_rows(self):
+        return ShoppingListItem.objects.order_by(
+            'user_id', 'ingredient_id'
+        ).values_list('user_id', 'ingredient_id', 'amount_sum')
+
+    def find_drift(self):
+        """Сравнивает два отсортированных потока строк слиянием."""
+        drift = Counter()
+        expected = self.expected_rows().iterator()
+        actual = self.actual_rows().iterator()
+        expected_row, actual_row = next(expected, None), next(actual, None)
+        while expected_row is not None or actual_row is not None:
+            if actual_row is None or (
+                expected_row is not None and expected_row[:2] < actual_row[:2]
+            ):
+                drift['missing'] += 1
+                expected_row = next(expected, None)
+            elif expected_row is None or actual_row[:2] < expected_row[:2]:
+                drift['extra'] += 1
+                actual_row = next(actual, None)
+            else:
+                if expected_row[2] != actual_row[2]:
+                    drift['wrong_amount'] += 1
+                expected_row = next(expected, None)
+                actual_row = next(actual, None)
+        return drift
+
+    @transaction.atomic
+    def rebuild(self, batch_size):
+        ShoppingListItem.objects.all().delete()
+        rows = self.expected_rows().iterator()
+        created = 0
+        while True:
+            batch = [
+                ShoppingListItem(
+                    user_id=user_id,
+                    ingredient_id=ingredient_id,
+                    amount_sum=amount_sum,
+                )
+                for user_id, ingredient_id, amount_sum in islice(
+                    rows, batch_size
+                )
+            ]
+            if not batch:
+                return created
+            ShoppingListItem.objects.bulk_create(batch)
+            created += len(batch)
+
+    def handle(self, *args, **options):
+        drift = self.find_drift()
+        if drift:
+            self.stdout.write(
+                self.style.WARNING(
+                    'Расхождения: нет строки - {0}, лишняя строка - {1}, '
+                    'неверное количество - {2}'.format(
+                        drift['missing'],
+                        drift['extra'],
+                        drift['wrong_amount'],
+                    )
+                )
+            )
+        else:
+            self.stdout.write(self.style.SUCCESS('Расхождений нет'))
+
+        if options['dry_run']:
+            return
+        created = self.rebuild(options['batch_size'])
+        self.stdout.write(
+            self.style.SUCCESS(f'Таблица пересобрана, строк: {created}')
+        )
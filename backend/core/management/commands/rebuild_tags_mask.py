@@ -0,0 +1,54 @@
+from itertools import groupby
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from recipes.models import Recipe, RecipeTag, get_tags_mask
+
+
+class Command(BaseCommand):
+    """Пересчитывает битовую маску тегов для всех рецептов.
+    шаблон: python manage.py rebuild_tags_mask
+    Нужна после загрузки RecipeTag в обход сериализатора и админки,
+    например через writecsv.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Количество рецептов в одном UPDATE',
+        )
+
+    def expected_masks(self):
+        rows = (
+            RecipeTag.objects.filter(tag__isnull=False)
+            .order_by('recipe_id')
+            .values_list('recipe_id', 'tag_id')
+        )
+        return {
+            recipe_id: get_tags_mask(tag_id for _, tag_id in tags)
+            for recipe_id, tags in groupby(
+                rows.iterator(), key=lambda row: row[0]
+            )
+        }
+
+    @transaction.atomic
+    def handle(self, *args, **options):
+        masks = self.expected_masks()
+        changed = [
+            Recipe(id=recipe_id, tags_mask=masks.get(recipe_id, 0))
+            for recipe_id, tags_mask in Recipe.objects.values_list(
+                'id', 'tags_mask'
+            ).iterator()
+            if masks.get(recipe_id, 0) != tags_mask
+        ]
+        Recipe.objects.bulk_update(
+            changed, ['tags_mask'], batch_size=options['batch_size']
+        )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Маска тегов исправлена у рецептов: {len(changed)}'
+            )
+        )
@@ -0,0 +1,107 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+
+from recipes.models import Favorite, Recipe
+from users.models import Follow, User, UserCounters
+
+
+def count_subquery(queryset, field):
+    return Coalesce(
+        Subquery(
+            queryset.order_by()
+            .values(field)
+            .annotate(count=Count('id'))
+            .values('count')
+        ),
+        0,
+    )
+
+
+class Command(BaseCommand):
+    """Пересчитывает денормализованные счётчики и исправляет расхождения.
+    шаблон: python manage.py repair_counters [--dry-run]
+    Recipe.favorites_count, UserCounters.recipes_count и followers_count
+    обновляются в представлениях и админке, а изменения в обход них
+    (bulk_create, удаление пользователей) сюда не попадают.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Только показать расхождения, не исправляя их',
+        )
+
+    def expected_favorites(self):
+        return count_subquery(
+            Favorite.objects.filter(recipe=OuterRef('pk')), 'recipe'
+        )
+
+    def expected_recipes(self):
+        return count_subquery(
+            Recipe.objects.filter(author=OuterRef('user')), 'author'
+        )
+
+    def expected_followers(self):
+        return count_subquery(
+            Follow.objects.filter(user=OuterRef('user')), 'user'
+        )
+
+    def create_missing_counters(self):
+        missing = User.objects.filter(counters__isnull=True).values_list(
+            'pk', flat=True
+        )
+        UserCounters.objects.bulk_create(
+            (UserCounters(user_id=pk) for pk in missing.iterator()),
+            batch_size=1000,
+            ignore_conflicts=True,
+        )
+
+    def find_drift(self):
+        recipes = (
+            Recipe.objects.alias(expected=self.expected_favorites())
+            .exclude(favorites_count=F('expected'))
+            .count()
+        )
+        users = (
+            UserCounters.objects.alias(
+                expected_recipes=self.expected_recipes(),
+                expected_followers=self.expected_followers(),
+            )
+            .exclude(
+                Q(recipes_count=F('expected_recipes'))
+                & Q(followers_count=F('expected_followers'))
+            )
+            .count()
+        )
+        missing = User.objects.filter(counters__isnull=True).count()
+        return recipes, users, missing
+
+    @transaction.atomic
+    def repair(self):
+        self.create_missing_counters()
+        Recipe.objects.update(favorites_count=self.expected_favorites())
+        UserCounters.objects.update(
+            recipes_count=self.expected_recipes(),
+            followers_count=self.expected_followers(),
+        )
+
+    def handle(self, *args, **options):
+        recipes, users, missing = self.find_drift()
+        if recipes or users or missing:
+            self.stdout.write(
+                self.style.WARNING(
+                    f'Расхождения: рецептов - {recipes}, '
+                    f'пользователей - {users}, '
+                    f'нет строки счётчиков - {missing}'
+                )
+            )
+        else:
+            self.stdout.write(self.style.SUCCESS('Расхождений нет'))
+
+        if options['dry_run']:
+            return
+        self.repair()
+        self.stdout.write(self.style.SUCCESS('Счётчики пересчитаны'))
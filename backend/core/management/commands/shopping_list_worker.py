@@ -0,0 +1,112 @@
+import time
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files import File
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from api.utilities import create_shopping_list, get_shopping_list_pdf
+from recipes.models import ShoppingListJob
+
+
+class Command(BaseCommand):
+    """Воркер очереди генерации списков покупок.
+    шаблон: python manage.py shopping_list_worker [--once]
+    Несколько воркеров можно запускать параллельно: задания
+    разбираются через SELECT ... FOR UPDATE SKIP LOCKED.
+    Задания, которые выполняются дольше SHOPPING_LIST_JOB_TIMEOUT
+    (воркер упал или был остановлен), помечаются как ошибочные.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Обработать текущую очередь и завершиться',
+        )
+        parser.add_argument(
+            '--sleep',
+            type=float,
+            default=1,
+            help='Пауза между опросами пустой очереди (секунды)',
+        )
+        parser.add_argument(
+            '--ttl',
+            type=int,
+            default=24,
+            help='Через сколько часов удалять выполненные задания',
+        )
+
+    def claim_job(self):
+        with transaction.atomic():
+            job = (
+                ShoppingListJob.objects.select_for_update(skip_locked=True)
+                .filter(status=ShoppingListJob.PENDING)
+                .order_by('created')
+                .first()
+            )
+            if job is None:
+                return None
+            job.status = ShoppingListJob.RUNNING
+            job.started = timezone.now()
+            job.save(update_fields=('status', 'started'))
+        return job
+
+    def process_job(self, job):
+        try:
+            file = get_shopping_list_pdf(create_shopping_list(job.user_id))
+            # случайное имя: файл нельзя найти перебором id
+            job.file.save(f'{uuid.uuid4().hex}.pdf', File(file), False)
+            job.status = ShoppingListJob.DONE
+        except Exception as error:
+            job.status = ShoppingListJob.FAILED
+            job.error = str(error)
+        job.finished = timezone.now()
+        job.save()
+
+        wait = (job.started - job.created).total_seconds()
+        render = (job.finished - job.started).total_seconds()
+        depth = ShoppingListJob.objects.filter(
+            status=ShoppingListJob.PENDING
+        ).count()
+        self.stdout.write(
+            f'Задание {job.id}: {job.status}, ожидание {wait:.2f} с, '
+            f'генерация {render:.2f} с, в очереди {depth}'
+        )
+
+    def fail_stale_jobs(self):
+        stale = ShoppingListJob.objects.filter(
+            status=ShoppingListJob.RUNNING,
+            started__lt=timezone.now()
+            - timedelta(seconds=settings.SHOPPING_LIST_JOB_TIMEOUT),
+        ).update(
+            status=ShoppingListJob.FAILED,
+            error='Превышено время обработки',
+            finished=timezone.now(),
+        )
+        if stale:
+            self.stdout.write(f'Брошенных заданий: {stale}')
+
+    def purge_jobs(self, ttl):
+        expired = ShoppingListJob.objects.filter(
+            status__in=(ShoppingListJob.DONE, ShoppingListJob.FAILED),
+            finished__lt=timezone.now() - timedelta(hours=ttl),
+        )
+        for job in expired.iterator():
+            job.file.delete(save=False)
+            job.delete()
+
+    def handle(self, *args, **options):
+        while True:
+            job = self.claim_job()
+            if job is not None:
+                self.process_job(job)
+                continue
+            self.fail_stale_jobs()
+            self.purge_jobs(options['ttl'])
+            if options['once']:
+                break
+            time.sleep(options['sleep'])
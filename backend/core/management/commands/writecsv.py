@@ -1,12 +1,16 @@
 import csv
 import os
+import time
+from itertools import chain, islice
 
 import django
 from django.apps import apps
 from django.core.management.base import BaseCommand
-from django.db.utils import OperationalError
+from django.db import connection, transaction
+from django.db.utils import IntegrityError, OperationalError
 
 from backend.settings import BASE_DIR
+from core.models import TableVersion
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
 django.setup()
@@ -14,17 +18,128 @@ django.setup()
 data_path = BASE_DIR / 'data'
 
 
+class ProgressFile:
+    """Обёртка над файлом для COPY, считающая прочитанные строки."""
+
+    def __init__(self, file, report):
+        self.file = file
+        self.report = report
+        self.rows = 0
+
+    def read(self, size=-1):
+        chunk = self.file.read(size)
+        self.rows += chunk.count('\n')
+        self.report(self.rows)
+        return chunk
+
+    def readline(self, size=-1):
+        line = self.file.readline(size)
+        self.rows += line.count('\n')
+        self.report(self.rows)
+        return line
+
+
 class Command(BaseCommand):
     """Кастомная команда записи данных из csv файлов в базу данных
     шаблон: python manage.py writecsv appname.Modelname csv_file_name
+    Строки вставляются пачками через bulk_create в одной транзакции,
+    с --copy на PostgreSQL файл передаётся в таблицу через COPY FROM STDIN.
     """
 
+    progress_interval = 1
+
     def add_arguments(self, parser):
         parser.add_argument(
             'model',
             help='Модель для которой записываются данные (appname.ModelName)',
         )
         parser.add_argument('csv_file', help='Имя csv файла')
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Количество строк в одном INSERT',
+        )
+        parser.add_argument(
+            '--copy',
+            action='store_true',
+            help='Загрузить файл через COPY FROM STDIN (только PostgreSQL)',
+        )
+        parser.add_argument(
+            '--no-header',
+            action='store_true',
+            help='Первая строка файла содержит данные, а не заголовок',
+        )
+
+    def get_field_names(self, model, columns_count):
+        # пропускает поле id
+        return [
+            field.attname
+            for field in model._meta.fields[1 : columns_count + 1]
+        ]
+
+    def make_reporter(self):
+        started = time.monotonic()
+        last_report = started
+
+        def report(rows, force=False):
+            nonlocal last_report
+            now = time.monotonic()
+            if not force and now - last_report < self.progress_interval:
+                return
+            last_report = now
+            rate = rows / max(now - started, 1e-6)
+            self.stdout.write(f'Записано строк: {rows} ({rate:.0f} строк/с)')
+
+        return report
+
+    def load_batched(self, model, csv_file, header, batch_size):
+        reader = csv.reader(csv_file)
+        if header:
+            next(reader, None)
+        first_row = next(reader, None)
+        if first_row is None:
+            return 0
+        field_names = self.get_field_names(model, len(first_row))
+        report = self.make_reporter()
+
+        rows = 0
+        reader = chain([first_row], reader)
+        with transaction.atomic():
+            while True:
+                batch = [
+                    model(**dict(zip(field_names, row)))
+                    for row in islice(reader, batch_size)
+                ]
+                if not batch:
+                    break
+                model.objects.bulk_create(batch)
+                rows += len(batch)
+                report(rows)
+        report(rows, force=True)
+        return rows
+
+    def load_copy(self, model, csv_file, header):
+        if header:
+            csv_file.readline()
+        start = csv_file.tell()
+        first_row = next(csv.reader([csv_file.readline()]), None)
+        if not first_row:
+            return 0
+        field_names = self.get_field_names(model, len(first_row))
+        csv_file.seek(start)
+
+        quote = connection.ops.quote_name
+        sql = 'COPY {0} ({1}) FROM STDIN WITH (FORMAT csv)'.format(
+            quote(model._meta.db_table),
+            ', '.join(quote(name) for name in field_names),
+        )
+        report = self.make_reporter()
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.cursor.copy_expert(sql, ProgressFile(csv_file, report))
+            rows = cursor.cursor.rowcount
+        report(rows, force=True)
+        return rows
 
     def handle(self, *args, **options):
         model_name = options['model']
@@ -32,21 +147,28 @@ class Command(BaseCommand):
 
         file_path = os.path.join(data_path, file_name)
         model = apps.get_model(model_name)
+        header = not options['no_header']
 
-        try:
-            with open(file_path, 'r', encoding='utf-8') as csv_file:
-                reader = csv.reader(csv_file)
-
-                next(reader)
+        if options['copy'] and connection.vendor != 'postgresql':
+            self.stdout.write(
+                self.style.ERROR(
+                    'Загрузка через COPY доступна только в PostgreSQL.'
+                )
+            )
+            return
 
-                for row in reader:
-                    obj = model()
-                    for field_index, field in enumerate(row):
-                        # получает имя поля, пропускает поле id
-                        field_name = obj._meta.fields[field_index + 1].attname
-                        # сохраняет значение из файла в поле
-                        setattr(obj, field_name, field)
-                    obj.save()
+        try:
+            with open(
+                file_path, 'r', encoding='utf-8', newline=''
+            ) as csv_file:
+                if options['copy']:
+                    self.load_copy(model, csv_file, header)
+                else:
+                    self.load_batched(
+                        model, csv_file, header, options['batch_size']
+                    )
+            # bulk_create и COPY не отправляют post_save
+            TableVersion.bump(model._meta.db_table)
 
             self.stdout.write(
                 self.style.SUCCESS(
@@ -55,7 +177,7 @@ class Command(BaseCommand):
             )
         except FileNotFoundError:
             self.stdout.write(self.style.ERROR(f'Файл {file_name} не найден.'))
-        except OperationalError:
+        except (OperationalError, IntegrityError):
             self.stdout.write(
                 self.style.ERROR(
                     'Вы попытались заполнить таблицу со '
@@ -0,0 +1,36 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    initial = True
+
+    dependencies = []
+
+    operations = [
+        migrations.CreateModel(
+            name='TableVersion',
+            fields=[
+                (
+                    'id',
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name='ID',
+                    ),
+                ),
+                (
+                    'table',
+                    models.CharField(
+                        max_length=100, unique=True, verbose_name='Таблица'
+                    ),
+                ),
+                (
+                    'version',
+                    models.PositiveBigIntegerField(
+                        default=0, verbose_name='Версия'
+                    ),
+                ),
+            ],
+        ),
+    ]
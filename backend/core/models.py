@@ -0,0 +1,35 @@
+from django.db import models
+from django.db.models import F
+
+
+class TableVersion(models.Model):
+    """Счётчик изменений таблицы, общий для всех воркеров."""
+
+    table = models.CharField(
+        max_length=100, unique=True, verbose_name='Таблица'
+    )
+    version = models.PositiveBigIntegerField(
+        default=0, verbose_name='Версия'
+    )
+
+    def __str__(self):
+        return '{0} v{1}'.format(self.table, self.version)
+
+    @classmethod
+    def get(cls, table):
+        return (
+            cls.objects.filter(table=table)
+            .values_list('version', flat=True)
+            .first()
+            or 0
+        )
+
+    @classmethod
+    def bump(cls, table):
+        if cls.objects.filter(table=table).update(version=F('version') + 1):
+            return
+        _, created = cls.objects.get_or_create(
+            table=table, defaults={'version': 1}
+        )
+        if not created:
+            cls.objects.filter(table=table).update(version=F('version') + 1)
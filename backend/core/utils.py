@@ -0,0 +1,47 @@
+import json
+
+from django.core.management.base import CommandError
+
+
+def iter_json_array(file, chunk_size=64 * 1024):
+    """Отдаёт элементы JSON-массива верхнего уровня по одному,
+    не загружая файл в память целиком."""
+    decoder = json.JSONDecoder()
+    buffer = ''
+    eof = False
+
+    def read_more():
+        nonlocal buffer, eof
+        if eof:
+            raise CommandError('Файл не является корректным JSON-массивом.')
+        chunk = file.read(chunk_size)
+        eof = not chunk
+        buffer += chunk
+
+    while not buffer.strip() and not eof:
+        read_more()
+    buffer = buffer.lstrip()
+    if not buffer.startswith('['):
+        raise CommandError('Файл не является корректным JSON-массивом.')
+    buffer = buffer[1:]
+
+    while True:
+        buffer = buffer.lstrip()
+        if not buffer:
+            read_more()
+        elif buffer[0] == ']':
+            return
+        elif buffer[0] == ',':
+            buffer = buffer[1:]
+        else:
+            try:
+                item, end = decoder.raw_decode(buffer)
+            except json.JSONDecodeError:
+                read_more()
+                continue
+            # элемент мог оборваться ровно на границе чанка
+            if end == len(buffer) and not eof:
+                read_more()
+                continue
+            yield item
+            buffer = buffer[end:]
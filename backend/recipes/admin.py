@@ -1,6 +1,13 @@
 from django.contrib import admin
+from django.db import transaction
+from django.db.models import Count
 
-
+from api.utilities import (
+    change_counter,
+    change_user_counter,
+    recipe_amounts,
+    update_recipe_in_shopping_lists,
+)
 from recipes.models import (
     Ingredient,
     Recipe,
@@ -9,29 +16,209 @@ from recipes.models import (
     RecipeIngredient,
     Favorite,
     ShoppingCart,
+    ShoppingListJob,
 )
+from recipes.renditions import schedule_renditions
+
+
+def change_recipes_count(author_id, delta):
+    change_user_counter(author_id, 'recipes_count', delta)
+
+
+def change_favorites_count(recipe_id, delta):
+    change_counter(
+        Recipe.objects.filter(pk=recipe_id), 'favorites_count', delta
+    )
+
+
+class RecipeIngredientInline(admin.TabularInline):
+    model = RecipeIngredient
+    autocomplete_fields = ('ingredient',)
+    min_num = 1
+    extra = 0
+
+    def get_queryset(self, request):
+        return (
+            super()
+            .get_queryset(request)
+            .select_related('recipe', 'ingredient')
+        )
+
+
+class RecipeTagInline(admin.TabularInline):
+    model = RecipeTag
+    min_num = 1
+    extra = 0
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('recipe', 'tag')
 
 
 class RecipeAdmin(admin.ModelAdmin):
     list_display = ('name', 'author')
-    list_filter = ('author', 'name', 'tags')
+    list_select_related = ('author',)
+    # фильтры по автору и названию выводили список всех значений,
+    # поэтому они заменены поиском
+    search_fields = ('name', 'author__username', 'author__email')
+    list_filter = ('tags',)
+    autocomplete_fields = ('author',)
     readonly_fields = ('favorite_count',)
+    inlines = (RecipeIngredientInline, RecipeTagInline)
+    show_full_result_count = False
 
     def favorite_count(self, obj):
-        return obj.favorites.all().count()
+        return obj.favorites_count
 
     favorite_count.short_description = 'Число добавлений в избранное'
 
+    def save_model(self, request, obj, form, change):
+        old_author_id = form.initial.get('author') if change else None
+        image_changed = 'image' in form.changed_data
+        if image_changed:
+            # старые копии относятся к прежней картинке
+            obj.renditions = {}
+        super().save_model(request, obj, form, change)
+        if image_changed:
+            schedule_renditions(obj.id)
+        if old_author_id != obj.author_id:
+            if old_author_id:
+                change_recipes_count(old_author_id, -1)
+            change_recipes_count(obj.author_id, 1)
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        change_recipes_count(obj.author_id, -1)
+
+    @transaction.atomic
+    def delete_queryset(self, request, queryset):
+        authors = list(
+            queryset.values('author_id')
+            .annotate(count=Count('id'))
+            .values_list('author_id', 'count')
+        )
+        super().delete_queryset(request, queryset)
+        for author_id, count in authors:
+            change_recipes_count(author_id, -count)
+
+    def save_related(self, request, form, formsets, change):
+        # ингредиенты меняются в инлайне, списки покупок
+        # обновляются так же, как при изменении рецепта через API
+        old_amounts = recipe_amounts(form.instance) if change else {}
+        super().save_related(request, form, formsets, change)
+        form.instance.update_tags_mask()
+        if change:
+            update_recipe_in_shopping_lists(form.instance, old_amounts)
+
+
+class RecipeTagAdmin(admin.ModelAdmin):
+    """После изменения связей пересчитывает маску тегов рецепта."""
+
+    list_select_related = ('recipe', 'tag')
+    autocomplete_fields = ('recipe',)
+    show_full_result_count = False
+
+    def save_model(self, request, obj, form, change):
+        old_recipe_id = form.initial.get('recipe')
+        super().save_model(request, obj, form, change)
+        obj.recipe.update_tags_mask()
+        if old_recipe_id and old_recipe_id != obj.recipe_id:
+            Recipe.objects.get(pk=old_recipe_id).update_tags_mask()
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        obj.recipe.update_tags_mask()
+
+    def delete_queryset(self, request, queryset):
+        recipe_ids = set(queryset.values_list('recipe_id', flat=True))
+        super().delete_queryset(request, queryset)
+        for recipe in Recipe.objects.filter(id__in=recipe_ids):
+            recipe.update_tags_mask()
+
+
+class RecipeIngredientAdmin(admin.ModelAdmin):
+    """Переносит изменения ингредиентов в списки покупок."""
+
+    list_select_related = ('recipe', 'ingredient')
+    autocomplete_fields = ('recipe', 'ingredient')
+    show_full_result_count = False
+
+    def save_model(self, request, obj, form, change):
+        recipe_ids = {obj.recipe_id, form.initial.get('recipe')} - {None}
+        old_amounts = {
+            recipe_id: recipe_amounts(recipe_id) for recipe_id in recipe_ids
+        }
+        super().save_model(request, obj, form, change)
+        for recipe_id, amounts in old_amounts.items():
+            update_recipe_in_shopping_lists(recipe_id, amounts)
+
+    def delete_model(self, request, obj):
+        old_amounts = recipe_amounts(obj.recipe_id)
+        super().delete_model(request, obj)
+        update_recipe_in_shopping_lists(obj.recipe_id, old_amounts)
+
+    @transaction.atomic
+    def delete_queryset(self, request, queryset):
+        old_amounts = {
+            recipe_id: recipe_amounts(recipe_id)
+            for recipe_id in set(queryset.values_list('recipe_id', flat=True))
+        }
+        super().delete_queryset(request, queryset)
+        for recipe_id, amounts in old_amounts.items():
+            update_recipe_in_shopping_lists(recipe_id, amounts)
+
+
+class UserRecipeAdmin(admin.ModelAdmin):
+    list_select_related = ('recipe', 'user')
+    autocomplete_fields = ('user', 'recipe')
+    show_full_result_count = False
+
+
+class FavoriteAdmin(UserRecipeAdmin):
+    """Поддерживает Recipe.favorites_count, как и представления."""
+
+    def save_model(self, request, obj, form, change):
+        old_recipe_id = form.initial.get('recipe') if change else None
+        super().save_model(request, obj, form, change)
+        if old_recipe_id != obj.recipe_id:
+            if old_recipe_id:
+                change_favorites_count(old_recipe_id, -1)
+            change_favorites_count(obj.recipe_id, 1)
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        change_favorites_count(obj.recipe_id, -1)
+
+    @transaction.atomic
+    def delete_queryset(self, request, queryset):
+        recipes = list(
+            queryset.values('recipe_id')
+            .annotate(count=Count('id'))
+            .values_list('recipe_id', 'count')
+        )
+        super().delete_queryset(request, queryset)
+        for recipe_id, count in recipes:
+            change_favorites_count(recipe_id, -count)
+
 
 class IngredientAdmin(admin.ModelAdmin):
     list_display = ('name', 'measurement_unit')
     search_fields = ('name',)
+    show_full_result_count = False
+
+
+class ShoppingListJobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'user', 'status', 'created', 'started', 'finished')
+    list_select_related = ('user',)
+    list_filter = ('status',)
+    autocomplete_fields = ('user',)
+    show_full_result_count = False
 
 
 admin.site.register(Ingredient, IngredientAdmin)
 admin.site.register(Recipe, RecipeAdmin)
 admin.site.register(Tag)
-admin.site.register(Favorite)
-admin.site.register(ShoppingCart)
-admin.site.register(RecipeTag)
-admin.site.register(RecipeIngredient)
+admin.site.register(Favorite, FavoriteAdmin)
+admin.site.register(ShoppingCart, UserRecipeAdmin)
+admin.site.register(RecipeTag, RecipeTagAdmin)
+admin.site.register(RecipeIngredient, RecipeIngredientAdmin)
+admin.site.register(ShoppingListJob, ShoppingListJobAdmin)
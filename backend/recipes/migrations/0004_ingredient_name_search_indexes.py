@@ -0,0 +1,30 @@
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('recipes', '0003_auto_20230701_2008'),
+    ]
+
+    # Выражения совпадают с тем, во что Django компилирует
+    # name__istartswith и name__icontains: UPPER("name"::text) LIKE ...
+    operations = [
+        TrigramExtension(),
+        migrations.RunSQL(
+            sql=(
+                'CREATE INDEX recipes_ingredient_name_upper_trgm '
+                'ON recipes_ingredient '
+                'USING gin (UPPER(name::text) gin_trgm_ops);'
+            ),
+            reverse_sql='DROP INDEX recipes_ingredient_name_upper_trgm;',
+        ),
+        migrations.RunSQL(
+            sql=(
+                'CREATE INDEX recipes_ingredient_name_upper_prefix '
+                'ON recipes_ingredient '
+                '(UPPER(name::text) varchar_pattern_ops);'
+            ),
+            reverse_sql='DROP INDEX recipes_ingredient_name_upper_prefix;',
+        ),
+    ]
@@ -0,0 +1,90 @@
+# Generated by Django 3.2 on 2026-10-18 19:25
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('recipes', '0004_ingredient_name_search_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ShoppingListJob',
+            fields=[
+                (
+                    'id',
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name='ID',
+                    ),
+                ),
+                (
+                    'status',
+                    models.CharField(
+                        choices=[
+                            ('pending', 'В очереди'),
+                            ('running', 'Выполняется'),
+                            ('done', 'Готово'),
+                            ('failed', 'Ошибка'),
+                        ],
+                        default='pending',
+                        max_length=10,
+                        verbose_name='Статус',
+                    ),
+                ),
+                (
+                    'file',
+                    models.FileField(
+                        blank=True,
+                        upload_to='shopping_lists',
+                        verbose_name='Файл',
+                    ),
+                ),
+                ('error', models.TextField(blank=True, verbose_name='Ошибка')),
+                (
+                    'created',
+                    models.DateTimeField(
+                        auto_now_add=True,
+                        verbose_name='Дата постановки в очередь',
+                    ),
+                ),
+                (
+                    'started',
+                    models.DateTimeField(
+                        blank=True, null=True, verbose_name='Начало обработки'
+                    ),
+                ),
+                (
+                    'finished',
+                    models.DateTimeField(
+                        blank=True,
+                        null=True,
+                        verbose_name='Окончание обработки',
+                    ),
+                ),
+                (
+                    'user',
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name='shopping_list_jobs',
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                'ordering': ('-created',),
+            },
+        ),
+        migrations.AddIndex(
+            model_name='shoppinglistjob',
+            index=models.Index(
+                fields=['status', 'created'], name='shopping_list_job_queue'
+            ),
+        ),
+    ]
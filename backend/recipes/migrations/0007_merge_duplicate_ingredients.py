@@ -0,0 +1,58 @@
+# Generated by Django 3.2 on 2026-10-18 19:30
+
+from django.db import migrations, models
+
+
+def merge_duplicate_ingredients(apps, schema_editor):
+    """Оставляет один ингредиент на каждую пару (название, мера),
+    переносит на него ссылки и складывает количества."""
+    Ingredient = apps.get_model('recipes', 'Ingredient')
+    RecipeIngredient = apps.get_model('recipes', 'RecipeIngredient')
+    ShoppingListItem = apps.get_model('recipes', 'ShoppingListItem')
+    duplicates = (
+        Ingredient.objects.values('name', 'measurement_unit')
+        .annotate(keep_id=models.Min('id'), total=models.Count('id'))
+        .filter(total__gt=1)
+        .order_by()
+    )
+    references = (
+        (RecipeIngredient, 'recipe_id', 'amount'),
+        (ShoppingListItem, 'user_id', 'amount_sum'),
+    )
+    for duplicate in list(duplicates):
+        keep_id = duplicate['keep_id']
+        duplicate_ids = list(
+            Ingredient.objects.filter(
+                name=duplicate['name'],
+                measurement_unit=duplicate['measurement_unit'],
+            )
+            .exclude(id=keep_id)
+            .values_list('id', flat=True)
+        )
+        for model, owner, amount in references:
+            for row in model.objects.filter(ingredient_id__in=duplicate_ids):
+                kept = model.objects.filter(
+                    **{owner: getattr(row, owner)}, ingredient_id=keep_id
+                ).first()
+                if kept is None:
+                    row.ingredient_id = keep_id
+                    row.save()
+                    continue
+                setattr(
+                    kept, amount, getattr(kept, amount) + getattr(row, amount)
+                )
+                kept.save()
+                row.delete()
+        Ingredient.objects.filter(id__in=duplicate_ids).delete()
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('recipes', '0006_shoppinglistitem'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            merge_duplicate_ingredients, migrations.RunPython.noop
+        ),
+    ]
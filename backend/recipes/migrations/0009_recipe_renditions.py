@@ -0,0 +1,21 @@
+# Generated by Django 3.2 on 2026-10-18 20:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('recipes', '0008_unique_ingredient'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='renditions',
+            field=models.JSONField(
+                blank=True,
+                default=dict,
+                verbose_name='Уменьшенные копии картинки',
+            ),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.2 on 2026-10-18 21:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('recipes', '0011_recipe_created_id_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='recipetag',
+            index=models.Index(
+                fields=['tag', 'recipe'], name='recipe_tag_tag_recipe'
+            ),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 3.2 on 2026-10-18 22:00
+
+from itertools import groupby
+
+from django.db import migrations, models
+
+TAGS_MASK_SIZE = 63
+
+
+def fill_tags_mask(apps, schema_editor):
+    Recipe = apps.get_model('recipes', 'Recipe')
+    RecipeTag = apps.get_model('recipes', 'RecipeTag')
+    rows = (
+        RecipeTag.objects.filter(tag__isnull=False, tag_id__lte=TAGS_MASK_SIZE)
+        .order_by('recipe_id')
+        .values_list('recipe_id', 'tag_id')
+    )
+    recipes = []
+    for recipe_id, tags in groupby(rows.iterator(), key=lambda row: row[0]):
+        mask = 0
+        for _, tag_id in tags:
+            mask |= 1 << (tag_id - 1)
+        recipes.append(Recipe(id=recipe_id, tags_mask=mask))
+    Recipe.objects.bulk_update(recipes, ['tags_mask'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('recipes', '0012_recipetag_tag_recipe_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='tags_mask',
+            field=models.BigIntegerField(
+                default=0, editable=False, verbose_name='Маска тегов'
+            ),
+        ),
+        migrations.RunPython(fill_tags_mask, migrations.RunPython.noop),
+    ]
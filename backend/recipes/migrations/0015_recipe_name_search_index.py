@@ -0,0 +1,19 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('recipes', '0014_recipe_favorites_count'),
+    ]
+
+    # поиск и autocomplete в админке: UPPER("name"::text) LIKE %...%
+    operations = [
+        migrations.RunSQL(
+            sql=(
+                'CREATE INDEX recipes_recipe_name_upper_trgm '
+                'ON recipes_recipe '
+                'USING gin (UPPER(name::text) gin_trgm_ops);'
+            ),
+            reverse_sql='DROP INDEX recipes_recipe_name_upper_trgm;',
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 3.2 on 2026-10-18 19:57
+
+from django.core.files.storage import FileSystemStorage
+from django.db import migrations, models
+
+import recipes.storage
+
+
+def move_job_files(apps, schema_editor):
+    """Переносит готовые списки покупок из MEDIA_ROOT, откуда их
+    раздавал nginx, в закрытое хранилище."""
+    ShoppingListJob = apps.get_model('recipes', 'ShoppingListJob')
+    public = FileSystemStorage()
+    private = recipes.storage.PrivateStorage()
+    for job in ShoppingListJob.objects.exclude(file='').iterator():
+        name = job.file.name
+        if not public.exists(name):
+            continue
+        with public.open(name) as file:
+            job.file.name = private.save(name, file)
+        job.save(update_fields=('file',))
+        public.delete(name)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('recipes', '0015_recipe_name_search_index'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='shoppinglistjob',
+            name='file',
+            field=models.FileField(
+                blank=True,
+                storage=recipes.storage.PrivateStorage(),
+                upload_to='shopping_lists',
+                verbose_name='Файл',
+            ),
+        ),
+        migrations.RunPython(move_job_files, migrations.RunPython.noop),
+    ]
@@ -1,5 +1,6 @@
 from django.db import models
 
+from recipes.storage import ContentHashStorage, PrivateStorage
 from users.models import User
 
 
@@ -22,17 +23,48 @@ class Ingredient(models.Model):
     )
     measurement_unit = models.CharField(max_length=200, verbose_name='Мера')
 
+    class Meta:
+        constraints = (
+            models.UniqueConstraint(
+                fields=('name', 'measurement_unit'), name='unique_ingredient'
+            ),
+        )
+
     def __str__(self):
         return self.name
 
 
+# bigint знаковый, поэтому в маске помещаются теги с id от 1 до 63
+TAGS_MASK_SIZE = 63
+
+
+def get_tags_mask(tag_ids):
+    """Битовая маска тегов: бит tag_id - 1 для каждого тега."""
+    mask = 0
+    for tag_id in tag_ids:
+        if tag_id is not None and 0 < tag_id <= TAGS_MASK_SIZE:
+            mask |= 1 << (tag_id - 1)
+    return mask
+
+
 class Recipe(models.Model):
     name = models.CharField(max_length=200, verbose_name='Название')
     text = models.TextField(verbose_name='Описание')
-    image = models.ImageField(upload_to='recipes/images')
+    image = models.ImageField(
+        upload_to='recipes/images', storage=ContentHashStorage()
+    )
+    renditions = models.JSONField(
+        default=dict, blank=True, verbose_name='Уменьшенные копии картинки'
+    )
     tags = models.ManyToManyField(
         Tag, through='RecipeTag', verbose_name='Теги'
     )
+    tags_mask = models.BigIntegerField(
+        default=0, editable=False, verbose_name='Маска тегов'
+    )
+    favorites_count = models.PositiveIntegerField(
+        default=0, editable=False, verbose_name='Число добавлений в избранное'
+    )
     author = models.ForeignKey(
         User,
         related_name='recipes',
@@ -51,11 +83,18 @@ class Recipe(models.Model):
     )
 
     class Meta:
-        ordering = ('-created',)
+        ordering = ('-created', '-id')
+        indexes = (
+            models.Index(fields=('-created', '-id'), name='recipe_created_id'),
+        )
 
     def __str__(self):
         return self.name
 
+    def update_tags_mask(self):
+        self.tags_mask = get_tags_mask(self.tags.values_list('id', flat=True))
+        Recipe.objects.filter(pk=self.pk).update(tags_mask=self.tags_mask)
+
 
 class RecipeTag(models.Model):
     recipe = models.ForeignKey(Recipe, on_delete=models.CASCADE)
@@ -67,9 +106,16 @@ class RecipeTag(models.Model):
                 fields=('recipe', 'tag'), name='unique_recipe_tag'
             ),
         )
+        # фильтр по тегам ищет рецепты по tag_id
+        indexes = (
+            models.Index(
+                fields=('tag', 'recipe'), name='recipe_tag_tag_recipe'
+            ),
+        )
 
     def __str__(self):
-        return ' {0} - {1}'.format(self.recipe.name, self.tag.name)
+        # тег мог быть удалён (SET_NULL)
+        return '{0} - {1}'.format(self.recipe.name, self.tag)
 
 
 class RecipeIngredient(models.Model):
@@ -90,7 +136,7 @@ class RecipeIngredient(models.Model):
         )
 
     def __str__(self):
-        return '{0} - {1}'.format(self.recipe.name, self.ingredient.name)
+        return '{0} - {1}'.format(self.recipe.name, self.ingredient)
 
 
 class Favorite(models.Model):
@@ -127,3 +173,75 @@ class ShoppingCart(models.Model):
 
     def __str__(self):
         return '{0} - {1}'.format(self.recipe.name, self.user.username)
+
+
+class ShoppingListItem(models.Model):
+    """Сумма ингредиента по всем рецептам в корзине пользователя."""
+
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name='shopping_list_items'
+    )
+    ingredient = models.ForeignKey(Ingredient, on_delete=models.CASCADE)
+    amount_sum = models.PositiveIntegerField(verbose_name='Общее кол-во')
+
+    class Meta:
+        constraints = (
+            models.UniqueConstraint(
+                fields=('user', 'ingredient'),
+                name='unique_shopping_list_item',
+            ),
+        )
+
+    def __str__(self):
+        return '{0} - {1}'.format(self.user_id, self.ingredient_id)
+
+
+class ShoppingListJob(models.Model):
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUSES = (
+        (PENDING, 'В очереди'),
+        (RUNNING, 'Выполняется'),
+        (DONE, 'Готово'),
+        (FAILED, 'Ошибка'),
+    )
+
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name='shopping_list_jobs'
+    )
+    status = models.CharField(
+        max_length=10,
+        choices=STATUSES,
+        default=PENDING,
+        verbose_name='Статус',
+    )
+    file = models.FileField(
+        upload_to='shopping_lists',
+        storage=PrivateStorage(),
+        blank=True,
+        verbose_name='Файл',
+    )
+    error = models.TextField(blank=True, verbose_name='Ошибка')
+    created = models.DateTimeField(
+        auto_now_add=True, verbose_name='Дата постановки в очередь'
+    )
+    started = models.DateTimeField(
+        null=True, blank=True, verbose_name='Начало обработки'
+    )
+    finished = models.DateTimeField(
+        null=True, blank=True, verbose_name='Окончание обработки'
+    )
+
+    class Meta:
+        ordering = ('-created',)
+        indexes = (
+            models.Index(
+                fields=('status', 'created'),
+                name='shopping_list_job_queue',
+            ),
+        )
+
+    def __str__(self):
+        return '{0} - {1}'.format(self.user_id, self.status)
@@ -0,0 +1,102 @@
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import connections, transaction
+from PIL import Image, features
+
+from recipes.models import Recipe
+
+logger = logging.getLogger(__name__)
+
+RENDITION_WIDTHS = (300, 600)
+RENDITION_QUALITY = 80
+
+executor = ThreadPoolExecutor(
+    max_workers=settings.IMAGE_RENDITION_WORKERS,
+    thread_name_prefix='renditions',
+)
+
+
+def rendition_formats(has_alpha):
+    """Форматы копий: WebP и запасной JPEG (PNG для картинок
+    с прозрачностью) для браузеров без поддержки WebP."""
+    formats = {'png': 'PNG'} if has_alpha else {'jpeg': 'JPEG'}
+    if features.check('webp'):
+        formats['webp'] = 'WEBP'
+    return formats
+
+
+def save_rendition(storage, name, image, image_format):
+    buffer = BytesIO()
+    image.save(buffer, image_format, quality=RENDITION_QUALITY)
+    # хранилище картинок называет файлы по содержимому, поэтому
+    # повторная генерация не создаёт новых файлов
+    return storage.save(name, ContentFile(buffer.getvalue()))
+
+
+def build_renditions(image_file):
+    """Сохраняет рядом с оригиналом копии шириной RENDITION_WIDTHS.
+
+    Возвращает словарь {формат: [[ширина, имя файла], ...]}.
+    Картинки меньше нужной ширины не увеличиваются.
+    """
+    storage = image_file.storage
+    stem = os.path.splitext(image_file.name)[0]
+    renditions = {}
+    with image_file.open('rb'), Image.open(image_file) as image:
+        has_alpha = image.mode in ('RGBA', 'LA', 'P')
+        image = image.convert('RGBA' if has_alpha else 'RGB')
+        formats = rendition_formats(has_alpha)
+        for index, width in enumerate(RENDITION_WIDTHS):
+            if index and width > image.width:
+                break
+            copy = image.copy()
+            copy.thumbnail((width, width * 2))
+            for extension, image_format in formats.items():
+                name = save_rendition(
+                    storage,
+                    f'{stem}_{width}w.{extension}',
+                    copy,
+                    image_format,
+                )
+                renditions.setdefault(extension, []).append([copy.width, name])
+    return renditions
+
+
+def generate_renditions(recipe_id):
+    """Создаёт копии картинки рецепта и записывает их в Recipe.renditions.
+
+    Если картинку успели заменить, результат не сохраняется:
+    для новой картинки запущена своя задача.
+    """
+    recipe = Recipe.objects.filter(pk=recipe_id).only('image').first()
+    if recipe is None or not recipe.image:
+        return None
+    renditions = build_renditions(recipe.image)
+    Recipe.objects.filter(pk=recipe_id, image=recipe.image.name).update(
+        renditions=renditions
+    )
+    return renditions
+
+
+def run_in_background(recipe_id):
+    try:
+        generate_renditions(recipe_id)
+    except Exception:
+        logger.exception(
+            'Не удалось создать копии картинки рецепта %s', recipe_id
+        )
+    finally:
+        # у потока пула своё подключение к базе
+        connections.close_all()
+
+
+def schedule_renditions(recipe_id):
+    """Ставит создание копий в пул потоков после коммита транзакции."""
+    transaction.on_commit(
+        lambda: executor.submit(run_in_background, recipe_id)
+    )
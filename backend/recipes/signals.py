@@ -0,0 +1,52 @@
+from django.db.models.signals import (
+    post_delete,
+    post_save,
+    pre_delete,
+    pre_save,
+)
+from django.dispatch import receiver
+
+from api.utilities import recipe_amounts, update_shopping_lists
+from core.models import TableVersion
+from recipes.models import Ingredient, ShoppingCart, Tag
+
+
+@receiver((post_save, post_delete), sender=Tag)
+@receiver((post_save, post_delete), sender=Ingredient)
+def bump_table_version(sender, **kwargs):
+    TableVersion.bump(sender._meta.db_table)
+
+
+# Списки покупок поддерживаются при любом изменении корзины: в API,
+# в админке и при каскадном удалении рецепта или его автора.
+# Добавление через API идёт в обход save() и учитывается во вьюсете.
+
+
+@receiver(pre_save, sender=ShoppingCart)
+def remove_replaced_cart_recipe(sender, instance, raw=False, **kwargs):
+    if raw or instance.pk is None:
+        return
+    old = (
+        ShoppingCart.objects.filter(pk=instance.pk)
+        .values_list('user_id', 'recipe_id')
+        .first()
+    )
+    if old:
+        user_id, recipe_id = old
+        update_shopping_lists([user_id], recipe_amounts(recipe_id, -1))
+
+
+@receiver(post_save, sender=ShoppingCart)
+def add_cart_recipe(sender, instance, raw=False, **kwargs):
+    if not raw:
+        update_shopping_lists(
+            [instance.user_id], recipe_amounts(instance.recipe_id)
+        )
+
+
+@receiver(pre_delete, sender=ShoppingCart)
+def remove_cart_recipe(sender, instance, **kwargs):
+    # до удаления: при каскаде ингредиенты рецепта ещё на месте
+    update_shopping_lists(
+        [instance.user_id], recipe_amounts(instance.recipe_id, -1)
+    )
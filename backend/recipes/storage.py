@@ -0,0 +1,73 @@
+import hashlib
+import os
+import tempfile
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+
+@deconstructible
+class ContentHashStorage(FileSystemStorage):
+    """Хранилище, называющее файлы по sha256 их содержимого.
+
+    Одинаковые файлы сохраняются один раз, а файл с данным именем
+    никогда не меняется, поэтому его можно кешировать навсегда.
+    Файлы не удаляются вместе с записями: ими могут пользоваться
+    несколько рецептов, лишние убирает команда collect_media_garbage.
+    """
+
+    def hashed_name(self, name, content):
+        sha256 = hashlib.sha256()
+        for chunk in content.chunks():
+            sha256.update(chunk)
+        content.seek(0)
+        directory, file_name = os.path.split(name)
+        extension = os.path.splitext(file_name)[1].lower()
+        return os.path.join(directory, sha256.hexdigest() + extension)
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        name = self.hashed_name(name, content)
+        if self.exists(name):
+            # обновляет дату изменения, чтобы сборщик мусора
+            # не удалил файл, на который сейчас сошлётся рецепт
+            os.utime(self.path(name))
+            return name
+        return super().save(name, content, max_length)
+
+    def get_available_name(self, name, max_length=None):
+        return name
+
+    def _save(self, name, content):
+        # одинаковый файл могут сохранять одновременно: пишем во
+        # временный файл и атомарно переименовываем его
+        full_path = self.path(name)
+        directory = os.path.dirname(full_path)
+        os.makedirs(directory, exist_ok=True)
+        descriptor, temp_path = tempfile.mkstemp(dir=directory, prefix='.')
+        try:
+            with os.fdopen(descriptor, 'wb') as file:
+                for chunk in content.chunks():
+                    file.write(chunk)
+            # mkstemp создаёт файл с правами 0o600, а nginx должен его читать
+            os.chmod(temp_path, self.file_permissions_mode or 0o644)
+            os.replace(temp_path, full_path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        return name
+
+
+@deconstructible
+class PrivateStorage(FileSystemStorage):
+    """Хранилище вне MEDIA_ROOT: nginx его не раздаёт, файлы отдаются
+    только через API после проверки прав."""
+
+    def __init__(self):
+        super().__init__(location=settings.PRIVATE_MEDIA_ROOT, base_url=None)
@@ -1,13 +1,53 @@
 from django.contrib import admin
+from django.db import transaction
+from django.db.models import Count
 
+from api.utilities import change_user_counter
 from users.models import Follow, User
 
 admin.site.unregister(User)
 
 
 class UserAdmin(admin.ModelAdmin):
-    list_filter = ('email', 'username')
+    # поиск вместо list_filter: фильтр выводил все email и имена
+    search_fields = ('email', 'username')
+    show_full_result_count = False
+
+
+def change_followers_count(user_id, delta):
+    change_user_counter(user_id, 'followers_count', delta)
+
+
+class FollowAdmin(admin.ModelAdmin):
+    """Поддерживает счётчик подписчиков автора (поле user)."""
+
+    list_select_related = ('user', 'following')
+    autocomplete_fields = ('user', 'following')
+    show_full_result_count = False
+
+    def save_model(self, request, obj, form, change):
+        old_user_id = form.initial.get('user') if change else None
+        super().save_model(request, obj, form, change)
+        if old_user_id != obj.user_id:
+            if old_user_id:
+                change_followers_count(old_user_id, -1)
+            change_followers_count(obj.user_id, 1)
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        change_followers_count(obj.user_id, -1)
+
+    @transaction.atomic
+    def delete_queryset(self, request, queryset):
+        authors = list(
+            queryset.values('user_id')
+            .annotate(count=Count('id'))
+            .values_list('user_id', 'count')
+        )
+        super().delete_queryset(request, queryset)
+        for user_id, count in authors:
+            change_followers_count(user_id, -count)
 
 
 admin.site.register(User, UserAdmin)
-admin.site.register(Follow)
+admin.site.register(Follow, FollowAdmin)
@@ -0,0 +1,82 @@
+# Generated by Django 3.2 on 2026-10-18 22:30
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def fill_user_counters(apps, schema_editor):
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split('.'))
+    Follow = apps.get_model('users', 'Follow')
+    Recipe = apps.get_model('recipes', 'Recipe')
+    UserCounters = apps.get_model('users', 'UserCounters')
+    UserCounters.objects.bulk_create(
+        (
+            UserCounters(user_id=pk)
+            for pk in User.objects.values_list('pk', flat=True)
+        ),
+        batch_size=1000,
+    )
+    UserCounters.objects.update(
+        recipes_count=Coalesce(
+            Subquery(
+                Recipe.objects.filter(author=OuterRef('user'))
+                .order_by()
+                .values('author')
+                .annotate(count=Count('id'))
+                .values('count')
+            ),
+            0,
+        ),
+        followers_count=Coalesce(
+            Subquery(
+                Follow.objects.filter(user=OuterRef('user'))
+                .order_by()
+                .values('user')
+                .annotate(count=Count('id'))
+                .values('count')
+            ),
+            0,
+        ),
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('recipes', '0013_recipe_tags_mask'),
+        ('users', '0003_alter_follow_options'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserCounters',
+            fields=[
+                (
+                    'user',
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name='counters',
+                        serialize=False,
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+                (
+                    'recipes_count',
+                    models.PositiveIntegerField(
+                        default=0, verbose_name='Количество рецептов'
+                    ),
+                ),
+                (
+                    'followers_count',
+                    models.PositiveIntegerField(
+                        default=0, verbose_name='Количество подписчиков'
+                    ),
+                ),
+            ],
+        ),
+        migrations.RunPython(fill_user_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,29 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('recipes', '0004_ingredient_name_search_indexes'),
+        ('users', '0004_usercounters'),
+    ]
+
+    # auth.User нельзя расширить индексами через Meta, поэтому индексы
+    # для поиска и autocomplete в админке создаются здесь
+    operations = [
+        migrations.RunSQL(
+            sql=(
+                'CREATE INDEX users_user_username_upper_trgm '
+                'ON auth_user '
+                'USING gin (UPPER(username::text) gin_trgm_ops);'
+            ),
+            reverse_sql='DROP INDEX users_user_username_upper_trgm;',
+        ),
+        migrations.RunSQL(
+            sql=(
+                'CREATE INDEX users_user_email_upper_trgm '
+                'ON auth_user '
+                'USING gin (UPPER(email::text) gin_trgm_ops);'
+            ),
+            reverse_sql='DROP INDEX users_user_email_upper_trgm;',
+        ),
+    ]
@@ -28,6 +28,25 @@ class Follow(models.Model):
         )
 
     def __str__(self):
-        return '{0} {1}'.format(
-            self.following.username, self.following.username
-        )
+        return '{0} - {1}'.format(self.following.username, self.user.username)
+
+
+class UserCounters(models.Model):
+    """Счётчики пользователя. Модель auth.User нельзя расширить
+    полями, поэтому они хранятся в отдельной таблице один к одному."""
+
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='counters',
+    )
+    recipes_count = models.PositiveIntegerField(
+        default=0, verbose_name='Количество рецептов'
+    )
+    followers_count = models.PositiveIntegerField(
+        default=0, verbose_name='Количество подписчиков'
+    )
+
+    def __str__(self):
+        return self.user.username